@@ -0,0 +1,166 @@
+"""감지 model backend 비교 benchmark (PyTorch ultralytics vs export한 ONNX)
+
+같은 fixture 결과 화면을 두 backend로 감지하여 class별 box IoU, 신뢰도 차이로 결과가 같은지 확인하고
+backend별 이미지당 p50/p95 처리 시간과 model을 불러온 뒤 늘어난 최대 메모리(RSS)를 비교
+
+    python -m benchmarks.bench_detector --torch best.pt --onnx best.onnx --corpus fixtures/
+    python -m benchmarks.bench_detector --torch best.pt --export --imgsz 480 --threads 2
+"""
+import argparse
+import json
+import os
+import psutil
+import time
+from benchmarks.bench_pipeline import percentile
+from benchmarks.bench_image import make_screenshot
+from datetime import datetime
+from PIL import Image
+from typing import Callable, Dict, List, Tuple
+from yolov8.image import open_image
+from yolov8.predict import DETECT_CONF, DETECT_IMGSZ, DETECT_THREADS, OnnxDetector, Predict, _build_predict, _to_predict
+
+
+def rss_mb() -> float:
+    # 현재 프로세스 메모리 (Windows에서도 동작)
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def load_images(corpus: str, count: int) -> List[Image.Image]:
+    if corpus:
+        images = []
+        for name in sorted(os.listdir(corpus)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(corpus, name), "rb") as file:
+                    images.append(open_image(file.read()))
+        return images
+    return [make_screenshot(1080, 1920, seed) for seed in range(count)]
+
+
+def load_onnx(model_path: str, imgsz: int, threads: int) -> Callable[[Image.Image], Predict]:
+    detector = OnnxDetector(model_path, imgsz, threads)
+    return lambda img: _build_predict(detector.detect([img])[0], True)
+
+
+def load_torch(model_path: str, imgsz: int, threads: int) -> Callable[[Image.Image], Predict]:
+    from ultralytics import YOLO
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+    model = YOLO(model_path)
+    return lambda img: _to_predict(model.predict(img, conf=DETECT_CONF, imgsz=imgsz, verbose=False)[0], True)
+
+
+def iou(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def measure(name: str, loader: Callable, model_path: str, args, images: List[Image.Image]) -> Tuple[dict, List[Predict]]:
+    """backend 하나를 불러와 warmup 후 처리 시간을 측정하는 함수
+
+    Returns:
+        Tuple[dict, List[Predict]]: 측정 결과, 마지막 반복의 이미지별 감지 결과
+    """
+    rss = rss_mb()
+    start = time.perf_counter()
+    detect = loader(model_path, args.imgsz, args.threads)
+    detect(images[0])  # warmup
+    load_seconds = time.perf_counter() - start
+    # 현재 값만 읽을 수 있으므로 반복마다 확인하여 최대값 사용
+    peak = rss_mb()
+    samples: List[float] = []
+    results: List[Predict] = []
+    for _ in range(args.iterations):
+        results = []
+        for img in images:
+            start = time.perf_counter()
+            results.append(detect(img))
+            samples.append(time.perf_counter() - start)
+        peak = max(peak, rss_mb())
+    return {
+        "backend": name,
+        "model": model_path,
+        "load_sec": load_seconds,
+        "rss_increase_mb": peak - rss,
+        "images_per_sec": len(samples) / sum(samples) if samples else 0.0,
+        **{f"p{q}_ms": percentile(samples, q) * 1000 for q in (50, 95, 99)},
+    }, results
+
+
+def agreement(reference: List[Predict], candidate: List[Predict], min_iou: float) -> dict:
+    """두 backend의 감지 결과가 얼마나 같은지 계산하는 함수
+    이미지별로 감지한 class 목록이 같고 모든 class의 box IoU가 min_iou 이상이면 일치로 봄
+
+    Returns:
+        dict: 일치 비율, IoU/신뢰도 차이 통계, 다른 이미지 목록
+    """
+    ious: List[float] = []
+    conf_diffs: List[float] = []
+    mismatches = []
+    for idx, (ref, cand) in enumerate(zip(reference, candidate)):
+        missing = sorted(set(ref.objects) - set(cand.objects))
+        extra = sorted(set(cand.objects) - set(ref.objects))
+        image_ious = {}
+        for class_nm in set(ref.objects) & set(cand.objects):
+            image_ious[class_nm] = iou(ref.objects[class_nm].pos, cand.objects[class_nm].pos)
+            conf_diffs.append(abs(ref.objects[class_nm].conf - cand.objects[class_nm].conf))
+        ious.extend(image_ious.values())
+        low = {class_nm: value for class_nm, value in image_ious.items() if value < min_iou}
+        if missing or extra or low:
+            mismatches.append({"image": idx, "missing": missing, "extra": extra, "low_iou": low})
+    return {
+        "images": len(reference),
+        "match_rate": 1 - len(mismatches) / len(reference) if reference else 0.0,
+        "mean_iou": sum(ious) / len(ious) if ious else 0.0,
+        "min_iou": min(ious) if ious else 0.0,
+        "max_conf_diff": max(conf_diffs) if conf_diffs else 0.0,
+        "mismatches": mismatches[:20],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--torch", help="PyTorch Yolov8 model (기본값 YOLO_MODEL_PATH)")
+    parser.add_argument("--onnx", help="export한 ONNX model (없으면 --torch model 경로의 .onnx)")
+    parser.add_argument("--export", action="store_true", help="ONNX model이 없으면 --torch model에서 export")
+    parser.add_argument("--imgsz", type=int, default=DETECT_IMGSZ)
+    parser.add_argument("--threads", type=int, default=DETECT_THREADS, help="CPU thread 수 (0이면 runtime 기본값)")
+    parser.add_argument("--corpus", help="fixture 결과 화면 폴더 (없으면 합성 이미지)")
+    parser.add_argument("--synthetic", type=int, default=8, help="합성 이미지 수")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--min-iou", type=float, default=0.9, help="같은 box로 볼 최소 IoU")
+    parser.add_argument("--output", help="결과 JSON 저장 위치")
+    args = parser.parse_args()
+
+    torch_path = args.torch or os.environ.get("YOLO_MODEL_PATH")
+    onnx_path = args.onnx or (os.path.splitext(torch_path)[0] + ".onnx" if torch_path else None)
+    if onnx_path and not os.path.exists(onnx_path) and args.export and torch_path:
+        from ultralytics import YOLO
+        onnx_path = YOLO(torch_path).export(format="onnx", imgsz=args.imgsz, dynamic=True)
+    images = load_images(args.corpus, args.synthetic)
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "imgsz": args.imgsz,
+        "threads": args.threads,
+        "images": len(images),
+        "backends": [],
+    }
+    results: Dict[str, List[Predict]] = {}
+    # 불러온 뒤 늘어난 최대 메모리를 비교하기 위해 가벼운 ONNX부터 불러옴
+    for name, loader, model_path in [("onnx", load_onnx, onnx_path), ("torch", load_torch, torch_path)]:
+        if model_path and os.path.exists(model_path):
+            backend, results[name] = measure(name, loader, model_path, args, images)
+            report["backends"].append(backend)
+    if "onnx" in results and "torch" in results:
+        report["agreement"] = agreement(results["torch"], results["onnx"], args.min_iou)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""OCR 이미지 생성 microbenchmark (cut + merge + jpeg encode)
+
+합성한 결과 화면과 감지 Box로 스크린샷 1장당 OCR 이미지 생성 시간을 측정하고
+이전 방식(요청마다 글꼴/title 생성, 사진별 paste)과 비교
+
+    python -m benchmarks.bench_image --iterations 200 --resolution 1080x1920
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import numpy as np
+import yolov8.image as image
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+from typing import Callable, Dict, List
+from yolov8.predict import Box
+
+CLASS_RATIO: Dict[str, tuple] = {
+    # 결과 화면 대비 각 객체의 대략적인 위치 (x1, y1, x2, y2)
+    "title": (0.08, 0.10, 0.92, 0.20),
+    "difficulty": (0.08, 0.22, 0.40, 0.27),
+    "result": (0.30, 0.30, 0.70, 0.36),
+    "score": (0.20, 0.40, 0.80, 0.48),
+    "rate": (0.15, 0.52, 0.85, 0.57),
+    "detail": (0.10, 0.60, 0.90, 0.80),
+}
+
+
+def make_screenshot(width: int, height: int, seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def make_boxes(width: int, height: int) -> List[Box]:
+    boxes = []
+    for class_nm, (x1, y1, x2, y2) in CLASS_RATIO.items():
+        box = Box()
+        box.class_nm = class_nm
+        jitter = random.uniform(-0.01, 0.01)
+        box.pos = ((x1 + jitter) * width, (y1 + jitter) * height, (x2 + jitter) * width, (y2 + jitter) * height)
+        box.conf = 0.9
+        boxes.append(box)
+    return boxes
+
+
+def legacy_merge(cutted_img: dict, size: tuple) -> Image.Image:
+    # 이전 구현: 요청마다 글꼴을 불러오고 title을 그려 한 장씩 paste
+    current_height = 0
+    murge_image = Image.new('RGB', size, image.BLACK)
+    for title, img in cutted_img.items():
+        title_image = Image.new('RGB', (size[0], image.TITLE_HEIGHT), image.BLACK)
+        draw = ImageDraw.Draw(title_image)
+        font = ImageFont.truetype(image.FONT_DIR_PATH, 20) if image.FONT_DIR_PATH else ImageFont.load_default()
+        draw.text((10, 0), title, font=font, fill=image.WHITE)
+        murge_image.paste(title_image, (0, current_height))
+        murge_image.paste(img, (0, current_height + image.TITLE_HEIGHT))
+        current_height += img.size[1] + image.TITLE_HEIGHT
+    return murge_image
+
+
+def run(screenshot: Image.Image, merge: Callable) -> float:
+    width, height = screenshot.size
+    start = time.perf_counter()
+    cutted_img = {box.class_nm: image.cut(screenshot, box) for box in make_boxes(width, height)}
+    size = image.calc_size(cutted_img)
+    ocr_ready_image = merge(cutted_img, size)
+    encoded = BytesIO()
+    ocr_ready_image.save(encoded, "jpeg")
+    return time.perf_counter() - start
+
+
+def summary(samples: List[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+        "per_sec": len(samples) / sum(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--resolution", default="1080x1920")
+    args = parser.parse_args()
+    width, height = map(int, args.resolution.split("x"))
+    screenshot = make_screenshot(width, height, 0)
+    screenshot.load()
+
+    result = {"resolution": args.resolution, "iterations": args.iterations}
+    for name, merge in (("legacy", legacy_merge), ("current", image.merge)):
+        random.seed(0)
+        run(screenshot, merge)
+        result[name] = summary([run(screenshot, merge) for _ in range(args.iterations)])
+    result["speedup"] = result["legacy"]["mean_ms"] / result["current"]["mean_ms"]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
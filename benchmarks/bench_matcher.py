@@ -0,0 +1,81 @@
+"""곡 제목 매칭 benchmark (sequence_matcher vs SequenceIndex)
+
+전체 곡 목록(T_SONG)을 대상으로 OCR 오류를 흉내낸 제목들을 만들어
+기존 선형 탐색과 색인 탐색의 결과가 같은지 확인하고 속도를 비교
+
+    python -m benchmarks.bench_matcher --samples 200
+"""
+import argparse
+import json
+import random
+import time
+import database
+from typing import List
+from yolov8.matcher import SequenceIndex
+from yolov8.ocr import sequence_matcher
+
+
+def make_noisy(title: str, rng: random.Random, rate: float) -> str:
+    """OCR 오류(문자 치환, 삭제, 공백 삽입)를 흉내낸 제목 생성 함수
+
+    Args:
+        title (str): 원본 제목
+        rng (random.Random): 난수 생성기
+        rate (float): 문자별 오류 확률
+
+    Returns:
+        str: 오류가 섞인 제목
+    """
+    chars: List[str] = []
+    for char in title:
+        roll = rng.random()
+        if roll < rate / 3:
+            continue
+        elif roll < rate * 2 / 3:
+            chars.append(rng.choice(title))
+        elif roll < rate:
+            chars.append(char + " ")
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    song_list = database.get_song_title()
+    rng = random.Random(args.seed)
+    targets = [make_noisy(rng.choice(song_list), rng, args.noise) for _ in range(args.samples)]
+
+    start = time.perf_counter()
+    index = SequenceIndex(song_list, cache_size=0)
+    build_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [sequence_matcher(target, song_list) for target in targets]
+    linear_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [index.match(target) for target in targets]
+    index_sec = time.perf_counter() - start
+
+    mismatch = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(json.dumps({
+        "catalog": len(song_list),
+        "samples": len(targets),
+        "mismatch": mismatch,
+        "index_build_ms": build_sec * 1000,
+        "linear_ms_per_query": linear_sec * 1000 / len(targets),
+        "index_ms_per_query": index_sec * 1000 / len(targets),
+        "speedup": linear_sec / index_sec if index_sec else None,
+    }, indent=2))
+    if mismatch:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
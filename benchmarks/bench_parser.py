@@ -0,0 +1,180 @@
+"""OCR 응답 분석 benchmark (저장된 OCR 응답 replay)
+
+JSON_DIR_PATH(또는 --dir)에 저장된 OCR 응답을 이전 방식(전역 CLASS_JOB 상태, 단어마다 difflib 비교)과
+OCRParser로 분석하여 결과가 같은지 확인하고, 응답 1개당 분석 시간과 여러 thread에서 동시에 분석한 처리량을 측정
+title 보정에 곡 목록을 쓰므로 sound_voltex.db가 있는 폴더에서 실행
+
+    python -m benchmarks.bench_parser --dir ./json --iterations 50 --threads 8
+    python -m benchmarks.bench_parser --synthetic 200
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import metrics
+from benchmarks.bench_image import summary
+from benchmarks.ocr_stub import DEFAULT_FIELDS
+from typing import Callable, Dict, List
+from yolov8.ocr import CLASS_LIST, DETAIL_LIST, JSON_DIR_PATH, RATE_LIST, RESULT_LIST, OCRParser, post_process, sequence_matcher
+
+# 이전 구현의 전역 작업 상태 (요청끼리 공유)
+CLASS_JOB: Dict[str, bool] = {"difficulty": False, "result": False,"score": False, "detail": False, "rate": False, "title": False}
+
+
+def legacy_parse(result: dict) -> List[dict]:
+    # 이전 구현: 전역 CLASS_JOB으로 작업을 바꾸고 단어마다 sequence_matcher로 label 확인
+    current_job = None
+    dup_switch = False
+    ocr_result_list: List[dict] = []
+    ocr_result = {}
+    ocr_value = None
+    for image in result['images']:
+        for field in image["fields"]:
+            value = field["inferText"]
+            title = sequence_matcher(value, CLASS_LIST, 0.9)
+            job_list = list(CLASS_JOB.values())
+            if (title is not None and True in job_list) or len(set(job_list)) == 1:
+                if current_job is None:
+                    current_job = title
+                    CLASS_JOB[title] = True
+                else:
+                    CLASS_JOB[current_job] = False
+                    CLASS_JOB[title] = True
+                    with metrics.stage("post_process"):
+                        ocr_value = post_process(current_job, ocr_value, dup_switch)
+                    ocr_result[current_job] = ocr_value
+                    current_job = title
+                ocr_value = [] if current_job == "detail" else ""
+                continue
+            if current_job == "result":
+                ocr_value += sequence_matcher(value, RESULT_LIST)
+            elif current_job == "detail":
+                matched = sequence_matcher(value, DETAIL_LIST, 0.35)
+                if matched is None:
+                    ocr_value.append(value)
+                    dup_switch = False
+                elif dup_switch is True:
+                    ocr_value.append("-1")
+                else:
+                    dup_switch = True
+            elif current_job == "score":
+                ocr_value += value
+            elif current_job == "rate":
+                matched = sequence_matcher(value, RATE_LIST, 0.45)
+                ocr_value += value if matched is None else matched + " "
+            elif current_job == "title":
+                ocr_value += value
+            elif current_job == "difficulty":
+                ocr_value += value + " "
+        with metrics.stage("post_process"):
+            ocr_value = post_process(current_job, ocr_value, dup_switch)
+        ocr_result[current_job] = ocr_value
+        ocr_result_list.append(ocr_result)
+        current_job = None
+        dup_switch = False
+        ocr_result = {}
+        ocr_value = None
+    return ocr_result_list
+
+
+def load_responses(dir_path: str) -> List[dict]:
+    responses = []
+    for name in sorted(os.listdir(dir_path)):
+        if name.endswith(".json"):
+            with open(os.path.join(dir_path, name), "r", encoding='utf-8') as file:
+                response = json.load(file)
+            if response.get("images"):
+                responses.append(response)
+    return responses
+
+
+def make_responses(count: int, seed: int = 0) -> List[dict]:
+    # stub 응답 단어에 OCR 오인식(글자 바꿈, label 중복, 빈 detail)을 섞은 합성 응답
+    rng = random.Random(seed)
+    responses = []
+    for _ in range(count):
+        images = []
+        for _ in range(rng.randint(1, 4)):
+            fields = []
+            for text in DEFAULT_FIELDS:
+                if text.isdigit():
+                    text = "".join(rng.choice("0123456789OI") if rng.random() < 0.05 else char for char in text)
+                elif rng.random() < 0.1 and len(text) > 3:
+                    idx = rng.randrange(len(text))
+                    text = text[:idx] + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + text[idx + 1:]
+                fields.append(text)
+                if text in DETAIL_LIST and rng.random() < 0.1:
+                    fields.append(text)
+            images.append({"fields": [{"inferText": text} for text in fields]})
+        responses.append({"images": images})
+    return responses
+
+
+def replay(parse: Callable[[dict], List[dict]], responses: List[dict], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        for response in responses:
+            start = time.perf_counter()
+            parse(response)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def concurrent(responses: List[dict], expected: List[List[dict]], threads: int, iterations: int) -> dict:
+    """여러 thread에서 OCRParser로 동시에 분석하여 결과가 섞이지 않는지 확인하는 함수
+
+    Returns:
+        dict: 처리량, 결과가 다른 응답 수
+    """
+    mismatches = []
+
+    def worker():
+        for _ in range(iterations):
+            for response, answer in zip(responses, expected):
+                if OCRParser().parse(response) != answer:
+                    mismatches.append(response)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return {"threads": threads, "per_sec": threads * iterations * len(responses) / seconds, "mismatches": len(mismatches)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default=JSON_DIR_PATH, help="저장된 OCR 응답 폴더")
+    parser.add_argument("--synthetic", type=int, default=0, help="합성 응답 수 (저장된 응답이 없으면 100)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    responses = load_responses(args.dir) if args.dir and os.path.isdir(args.dir) else []
+    synthetic = args.synthetic or (0 if responses else 100)
+    responses += make_responses(synthetic)
+    # 이전 구현은 첫 단어를 label로 보고 전역 상태를 시작하므로 결과 비교 전에 한 번 실행
+    legacy_parse(responses[0])
+    expected = [legacy_parse(response) for response in responses]
+    parsed = [OCRParser().parse(response) for response in responses]
+    mismatches = [idx for idx, (old, new) in enumerate(zip(expected, parsed)) if old != new]
+
+    result = {
+        "responses": len(responses),
+        "synthetic": synthetic,
+        "iterations": args.iterations,
+        "mismatches": mismatches[:20],
+        "legacy": summary(replay(legacy_parse, responses, args.iterations)),
+        "current": summary(replay(lambda response: OCRParser().parse(response), responses, args.iterations)),
+        "concurrent": concurrent(responses, expected, args.threads, args.iterations),
+    }
+    result["speedup"] = result["legacy"]["mean_ms"] / result["current"]["mean_ms"]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""업로드 전체 파이프라인 benchmark (decode -> rotate -> predict -> cut -> merge -> encode -> OCR -> post_process)
+
+fixture 결과 화면(--corpus) 또는 합성 이미지를 여러 해상도로 만들어 /upload와 같은 순서로 처리하고
+단계별 p50/p95/p99와 초당 처리량을 JSON으로 저장. OCR은 로컬 stub 서버(저장된 OCR 응답)를 사용
+
+    python -m benchmarks.bench_pipeline --corpus fixtures/ --response json/xxx.json --output result.json
+    python -m benchmarks.bench_pipeline --compare result.json   # 이전 결과보다 느려지면 exit 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import metrics
+import yolov8.image as image
+import yolov8.ocr as ocr
+from benchmarks import ocr_stub
+from benchmarks.bench_image import make_boxes, make_screenshot
+from datetime import datetime
+from io import BytesIO
+from PIL import Image
+from typing import Dict, List
+from yolov8.ocr_cache import OCRCache
+from yolov8.ocr_client import OCRClient
+from yolov8.predict import Predict, predict
+
+MIN_DETECT_COUNT = 5
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    idx = min(len(samples) - 1, max(0, int(round(q / 100 * len(samples) + 0.5)) - 1))
+    return samples[idx]
+
+
+def load_corpus(corpus: str, resolution: str, count: int) -> List[bytes]:
+    """해상도별 업로드 이미지 생성 함수 (세로 화면 기준, 가로 이미지는 회전 단계를 거침)
+
+    Args:
+        corpus (str): fixture 결과 화면 폴더, 없으면 합성 이미지 사용
+        resolution (str): WIDTHxHEIGHT
+        count (int): 합성 이미지 수
+
+    Returns:
+        List[bytes]: jpeg 업로드 이미지 List
+    """
+    width, height = map(int, resolution.split("x"))
+    if corpus:
+        images = [Image.open(os.path.join(corpus, name)).convert("RGB") for name in sorted(os.listdir(corpus))
+                  if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+        images = [img.resize((width, height) if img.width <= img.height else (height, width)) for img in images]
+    else:
+        images = [make_screenshot(width, height, seed) for seed in range(count)]
+    uploads = []
+    for img in images:
+        buffer = BytesIO()
+        img.save(buffer, "jpeg", quality=90)
+        uploads.append(buffer.getvalue())
+    return uploads
+
+
+async def run_one(model_path: str, upload: bytes) -> Dict[str, float]:
+    with metrics.trace() as timings:
+        start = time.perf_counter()
+        img = image.SourceImage(upload)
+        with metrics.stage("predict"):
+            result = img.to_full(predict(model_path, img.detect_img))
+        if len(result) < MIN_DETECT_COUNT:
+            # 합성 이미지처럼 감지가 안 되는 경우 고정 배치의 Box로 이후 단계를 측정
+            result = Predict()
+            for box in make_boxes(*img.size):
+                result.add(box)
+            timings["synthetic_boxes"] = 1.0
+        ocr_ready, local, outcomes = image.compose_local(img, result)
+        metrics.observe_local_ocr(outcomes)
+        await ocr.req_OCR_data(BytesIO(ocr_ready), "bench", local)
+        timings["total"] = time.perf_counter() - start
+    return timings
+
+
+async def run(args) -> dict:
+    response = None
+    if args.response:
+        with open(args.response, encoding='utf-8') as file:
+            response = json.load(file)
+    server = ocr_stub.start(response=response, latency_ms=args.ocr_latency_ms)
+    # 원격 OCR API 대신 stub 서버 사용, 같은 이미지의 반복 측정을 위해 OCR cache는 끔
+    ocr.OCR_CLIENT = OCRClient(url=server.url, token="bench")
+    ocr.OCR_CACHE = OCRCache(None)
+    model_path = args.model or os.environ.get("YOLO_MODEL_PATH")
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "model": model_path,
+        "iterations": args.iterations,
+        "resolutions": {},
+    }
+    try:
+        for resolution in args.resolutions.split(","):
+            uploads = load_corpus(args.corpus, resolution, args.synthetic)
+            await run_one(model_path, uploads[0])  # warmup
+            samples: Dict[str, List[float]] = {}
+            synthetic = 0
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                for upload in uploads:
+                    timings = await run_one(model_path, upload)
+                    synthetic += int(timings.pop("synthetic_boxes", 0))
+                    for stage, seconds in timings.items():
+                        samples.setdefault(stage, []).append(seconds)
+            elapsed = time.perf_counter() - start
+            count = args.iterations * len(uploads)
+            report["resolutions"][resolution] = {
+                "images": count,
+                "synthetic_boxes": synthetic,
+                "throughput_per_sec": count / elapsed,
+                "stages": {
+                    stage: {f"p{q}_ms": percentile(values, q) * 1000 for q in (50, 95, 99)}
+                    for stage, values in samples.items()
+                },
+            }
+    finally:
+        server.shutdown()
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """이전 결과와 비교해 느려진 단계를 찾는 함수
+
+    Args:
+        report (dict): 이번 결과
+        baseline (dict): 이전 결과
+        threshold (float): 허용 비율 (0.1 = 10% 느려짐까지 허용)
+
+    Returns:
+        List[str]: 느려진 단계 설명 List
+    """
+    regressions = []
+    for resolution, current in report["resolutions"].items():
+        previous = baseline.get("resolutions", {}).get(resolution)
+        if previous is None:
+            continue
+        for stage, values in current["stages"].items():
+            old = previous["stages"].get(stage, {}).get("p95_ms")
+            if old and values["p95_ms"] > old * (1 + threshold):
+                regressions.append(f"{resolution} {stage} p95 {old:.1f}ms -> {values['p95_ms']:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="fixture 결과 화면 폴더 (없으면 합성 이미지)")
+    parser.add_argument("--synthetic", type=int, default=4, help="해상도별 합성 이미지 수")
+    parser.add_argument("--resolutions", default="720x1280,1080x1920,3024x4032")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--model", help="Yolov8 model (기본값 YOLO_MODEL_PATH)")
+    parser.add_argument("--response", help="stub 서버가 돌려줄 저장된 OCR 응답 JSON")
+    parser.add_argument("--ocr-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="결과 JSON 저장 위치")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
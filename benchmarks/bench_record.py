@@ -0,0 +1,85 @@
+"""기록 저장 benchmark (한 건씩 저장 vs bulk 저장)
+
+임시 SQLite DB에 여러 writer thread가 동시에 기록을 저장할 때의 초당 저장 수와
+"database is locked" 오류 수를 측정
+
+    python -m benchmarks.bench_record --writers 8 --rows 2000 --batch 100
+    python -m benchmarks.bench_record --no-tuning   # pragma 설정 없는 기본 engine과 비교
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import crud.default as crud
+from database import create_db_engine
+from datetime import datetime, timedelta
+from migrate import migrate
+from models.song import RecordItem
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from typing import List
+
+
+def make_items(writer: int, rows: int) -> List[RecordItem]:
+    start = datetime(2024, 1, 1)
+    return [
+        RecordItem(TITLE=f"Song {idx % 500}", DIFFICULTY="EXH", RESULT="COMPLETE", SCORE=str(9000000 + idx),
+                   SCORE_DETAIL="1200,300,12,3", USERNAME=f"user{writer}", DT=start + timedelta(seconds=idx))
+        for idx in range(rows)
+    ]
+
+
+def run(mode: str, writers: int, rows: int, batch: int, tuning: bool) -> dict:
+    with tempfile.TemporaryDirectory() as dir_path:
+        db_url = f"sqlite:///{os.path.join(dir_path, 'bench.db')}"
+        engine = create_db_engine(db_url) if tuning else create_engine(db_url, connect_args={"check_same_thread": False})
+        migrate(engine)
+        session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        errors = [0]
+        lock = threading.Lock()
+
+        def write(writer: int):
+            items = make_items(writer, rows)
+            chunks = [[item] for item in items] if mode == "single" else [items[idx:idx + batch] for idx in range(0, rows, batch)]
+            for chunk in chunks:
+                # HTTP 요청처럼 요청마다 새 session 사용
+                db = session()
+                try:
+                    if mode == "single":
+                        crud.create_record(chunk[0], db)
+                    else:
+                        crud.create_records(chunk, db)
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        errors[0] += 1
+                finally:
+                    db.close()
+
+        threads = [threading.Thread(target=write, args=(writer,)) for writer in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return {"mode": mode, "rows": writers * rows, "seconds": elapsed, "rows_per_sec": writers * rows / elapsed, "locked_errors": errors[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="writer별 저장할 기록 수")
+    parser.add_argument("--batch", type=int, default=100, help="bulk 저장 한 번에 넣을 기록 수")
+    parser.add_argument("--no-tuning", action="store_true")
+    args = parser.parse_args()
+    results = [run(mode, args.writers, args.rows, args.batch, not args.no_tuning) for mode in ("single", "bulk")]
+    print(json.dumps({"writers": args.writers, "batch": args.batch, "tuning": not args.no_tuning, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""FastAPI 서버 closed-loop 부하 생성기
+
+임시 SQLite DB, 썸네일, 로컬 OCR stub으로 main.py 서버(uvicorn)를 띄우고
+동시 접속 수를 단계적으로 올리며 endpoint 구성(mix)대로 요청을 보내
+endpoint별 RPS, p50/p95/p99, 오류율과 지연 시간이 무너지는 동시 접속 수를 측정
+
+    python -m benchmarks.loadgen --concurrency 1,4,16,32 --duration 20 --workers 2 --image fixtures/result.jpg
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --mix title=5,thumb=10,record_get=5
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+from benchmarks import ocr_stub
+from benchmarks.bench_pipeline import percentile
+from crud.thumbnail import title_hash
+from datetime import datetime, timedelta
+from io import BytesIO
+from PIL import Image
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "upload=1,title=5,thumb=10,record_post=2,record_get=5"
+SONGS: List[str] = [f"Load Song {idx}" for idx in range(200)]
+USERS: List[str] = [f"user{idx}" for idx in range(50)]
+DIFFICULTIES: List[str] = ["NOV", "ADV", "EXH", "MXM"]
+
+
+def prepare_workdir(dir_path: str) -> Dict[str, str]:
+    """임시 DB(T_SONG)와 썸네일 폴더를 만드는 함수 (T_RECORD는 서버 시작시 migrate로 생성)
+
+    Args:
+        dir_path (str): 서버 작업 폴더
+
+    Returns:
+        Dict[str, str]: 서버 환경 변수
+    """
+    conn = sqlite3.connect(os.path.join(dir_path, "sound_voltex.db"))
+    conn.execute("CREATE TABLE T_SONG (TITLE VARCHAR NOT NULL, AUTHOR VARCHAR NOT NULL, BPM VARCHAR, DIFFICULTY TEXT, PRIMARY KEY (TITLE, AUTHOR))")
+    conn.executemany("INSERT INTO T_SONG VALUES (?, ?, ?, ?)", [(title, "Load Author", "180", "EXH 18") for title in SONGS])
+    conn.commit()
+    conn.close()
+    thumbnail_dir = os.path.join(dir_path, "thumbnail")
+    for title in SONGS:
+        title_dir = os.path.join(thumbnail_dir, title_hash(title))
+        os.makedirs(title_dir, exist_ok=True)
+        for difficulty in DIFFICULTIES:
+            Image.new("RGB", (512, 512), (random.randrange(256), 64, 128)).save(os.path.join(title_dir, f"{difficulty}.jpg"))
+    env = {"THUMBNAIL_DIR_PATH": thumbnail_dir}
+    for name in ["UPLOAD_DIR_PATH", "DETECT_DIR_PATH", "OCR_READY_DIR_PATH", "JSON_DIR_PATH"]:
+        path = os.path.join(dir_path, name.lower())
+        os.makedirs(path, exist_ok=True)
+        env[name] = path
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(dir_path: str, env: Dict[str, str], workers: int) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    server_env = dict(os.environ, **env)
+    server_env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=dir_path, env=server_env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with {process.returncode}")
+        try:
+            requests.get(f"{url}/api/v1/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("server did not start")
+
+
+def make_requests(url: str, image: bytes) -> Dict[str, Callable[[requests.Session], requests.Response]]:
+    """endpoint별 요청 함수 생성 함수
+
+    Args:
+        url (str): 서버 주소
+        image (bytes): 업로드할 결과 화면
+
+    Returns:
+        Dict[str, Callable[[requests.Session], requests.Response]]: endpoint 이름 -> 요청 함수
+    """
+    api = f"{url}/api/v1"
+
+    def record_post(session: requests.Session) -> requests.Response:
+        item = {
+            "TITLE": random.choice(SONGS), "DIFFICULTY": random.choice(DIFFICULTIES), "RESULT": "COMPLETE",
+            "SCORE": str(random.randint(8000000, 10000000)), "SCORE_DETAIL": "1200,300,12,3",
+            "USERNAME": random.choice(USERS),
+            "DT": (datetime(2024, 1, 1) + timedelta(microseconds=random.getrandbits(48))).isoformat(),
+        }
+        return session.post(f"{api}/record", json=item)
+
+    return {
+        # 같은 이미지는 서버에서 중복 제거되므로 jpeg 끝에 무작위 byte를 붙여 매번 다른 업로드로 만듦
+        "upload": lambda session: session.post(f"{api}/upload", files={"file": ("result.jpg", image + os.urandom(16), "image/jpeg")}),
+        "title": lambda session: session.get(f"{api}/title/all"),
+        "thumb": lambda session: session.get(f"{api}/{random.choice(SONGS)}/img/{random.choice(DIFFICULTIES)}", params={"w": 128}),
+        "record_post": record_post,
+        "record_get": lambda session: session.get(f"{api}/record/{random.choice(USERS)}", params={"limit": 50}),
+    }
+
+
+def run_level(calls: Dict[str, Callable], mix: List[Tuple[str, int]], concurrency: int, duration: float) -> dict:
+    """동시 접속 수 하나에 대해 closed-loop로 요청을 보내는 함수
+    각 client는 응답을 받은 뒤 다음 요청을 보냄
+
+    Returns:
+        dict: endpoint별 결과
+    """
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    samples: Dict[str, List[Tuple[float, int]]] = {name: [] for name in names}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        local: List[Tuple[str, float, int]] = []
+        while time.monotonic() < stop:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = calls[name](session).status_code
+            except requests.RequestException:
+                # 연결 실패는 status 0으로 기록
+                status = 0
+            local.append((name, time.perf_counter() - start, status))
+        with lock:
+            for name, seconds, status in local:
+                samples[name].append((seconds, status))
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result = {"concurrency": concurrency, "endpoints": {}}
+    total = 0
+    for name, values in samples.items():
+        latencies = [seconds for seconds, _ in values]
+        # 404(기록 없음), 400(인식 실패)은 정상 응답으로 보고 5xx와 연결 실패만 오류로 봄
+        errors = sum(1 for _, status in values if status == 0 or status >= 500)
+        status_count: Dict[str, int] = {}
+        for _, status in values:
+            status_count[str(status)] = status_count.get(str(status), 0) + 1
+        total += len(values)
+        result["endpoints"][name] = {
+            "requests": len(values),
+            "status": status_count,
+            "rps": len(values) / duration,
+            "error_rate": errors / len(values) if values else 0.0,
+            **{f"p{q}_ms": percentile(latencies, q) * 1000 for q in (50, 95, 99)},
+        }
+    all_latencies = [seconds for values in samples.values() for seconds, _ in values]
+    result["rps"] = total / duration
+    result["p95_ms"] = percentile(all_latencies, 95) * 1000
+    return result
+
+
+def find_knee(levels: List[dict], slo_ms: float) -> Optional[int]:
+    """지연 시간이 무너지는 동시 접속 수를 찾는 함수
+    전체 p95가 SLO를 넘거나, 동시 접속을 늘려도 RPS가 5% 이상 늘지 않는 첫 단계
+
+    Returns:
+        Optional[int]: 동시 접속 수, 끝까지 무너지지 않으면 None
+    """
+    for previous, current in zip([None] + levels[:-1], levels):
+        if current["p95_ms"] > slo_ms:
+            return current["concurrency"]
+        if previous is not None and current["rps"] < previous["rps"] * 1.05:
+            return current["concurrency"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="이미 실행중인 서버 주소 (없으면 임시 서버 실행)")
+    parser.add_argument("--workers", type=int, default=1, help="임시 서버 uvicorn worker 수")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    parser.add_argument("--duration", type=float, default=15.0, help="단계별 측정 시간(초)")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--image", help="업로드할 결과 화면 (없으면 합성 이미지)")
+    parser.add_argument("--ocr-latency-ms", type=float, default=200.0)
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="전체 p95 허용 지연 시간")
+    parser.add_argument("--output", help="결과 JSON 저장 위치")
+    args = parser.parse_args()
+
+    mix = [(name, int(weight)) for name, weight in (item.split("=") for item in args.mix.split(","))]
+    if args.image:
+        with open(args.image, "rb") as file:
+            image = file.read()
+    else:
+        buffer = BytesIO()
+        Image.new("RGB", (1080, 1920), (32, 32, 32)).save(buffer, "jpeg")
+        image = buffer.getvalue()
+
+    stub = None
+    process = None
+    with tempfile.TemporaryDirectory() as dir_path:
+        try:
+            url = args.url
+            if url is None:
+                stub = ocr_stub.start(latency_ms=args.ocr_latency_ms)
+                env = prepare_workdir(dir_path)
+                env.update({"OCR_API_URL": stub.url, "OCR_TOKEN": "loadgen"})
+                process, url = start_server(dir_path, env, args.workers)
+            calls = make_requests(url, image)
+            levels = []
+            for concurrency in map(int, args.concurrency.split(",")):
+                level = run_level(calls, mix, concurrency, args.duration)
+                levels.append(level)
+                print(f"concurrency={concurrency} rps={level['rps']:.1f} p95={level['p95_ms']:.1f}ms", file=sys.stderr)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+            if stub is not None:
+                stub.shutdown()
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "workers": args.workers if args.url is None else None,
+        "mix": dict(mix),
+        "duration": args.duration,
+        "slo_ms": args.slo_ms,
+        "knee_concurrency": find_knee(levels, args.slo_ms),
+        "levels": levels,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""로컬 OCR API stub 서버
+
+원격 OCR API(V2 형식)를 흉내내는 HTTP 서버, 저장된 OCR 응답 JSON(JSON_DIR_PATH) 또는
+기본 응답을 돌려주며 지연 시간과 5xx 실패 비율을 조절할 수 있음
+여러 이미지 요청(batch)은 이미지마다 이름(name)을 붙인 결과를 돌려주고,
+요청당 최대 이미지 수와 이미지당 추가 지연 시간을 흉내낼 수 있음
+
+    python -m benchmarks.ocr_stub --port 8900 --latency-ms 300 --fail-rate 0.1
+    python -m benchmarks.ocr_stub --latency-ms 300 --per-image-ms 20 --max-images 8
+    OCR_API_URL=http://127.0.0.1:8900/ocr
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_FIELDS: List[str] = [
+    "difficulty", "EXHAUST 18",
+    "result", "COMPLETE",
+    "score", "09876543",
+    "detail", "S-CRITICAL", "1200", "CRITICAL", "300", "NEAR", "12", "ERROR", "3",
+    "rate", "EFFECTIVE RATE", "98.50%",
+    "title", "Sample Song",
+]
+
+
+class OCRStubServer(ThreadingHTTPServer):
+    """
+    OCR API stub 서버 Class
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], fields: Optional[List[str]] = None, response: Optional[dict] = None,
+                 latency_ms: float = 0.0, fail_rate: float = 0.0, token: Optional[str] = None,
+                 per_image_ms: float = 0.0, max_images: Optional[int] = None) -> None:
+        super().__init__(address, OCRStubHandler)
+        self.fields = fields or DEFAULT_FIELDS
+        self.response = response
+        self.latency = latency_ms / 1000
+        self.per_image = per_image_ms / 1000
+        self.max_images = max_images
+        self.fail_rate = fail_rate
+        self.token = token
+        self.request_count: int = 0
+        self.image_count: int = 0
+        # 요청당 이미지 수 -> 요청 수
+        self.batch_sizes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/ocr"
+
+    def build_response(self, data: dict) -> dict:
+        """OCR 요청에 대한 응답 생성 함수, 요청한 이미지마다 결과를 하나씩 만듦
+
+        Args:
+            data (dict): OCR 요청 데이터
+
+        Returns:
+            dict: OCR 응답
+        """
+        images = []
+        for idx, image in enumerate(data.get("images", [])):
+            if self.response is not None:
+                recorded = self.response["images"]
+                result = dict(recorded[idx % len(recorded)])
+            else:
+                result = {
+                    "inferResult": "SUCCESS",
+                    "message": "SUCCESS",
+                    "fields": [{"inferText": text, "inferConfidence": 0.99} for text in self.fields],
+                }
+            result["uid"] = uuid.uuid4().hex
+            result["name"] = image.get("name")
+            images.append(result)
+        return {"version": "V2", "requestId": data.get("requestId"), "timestamp": int(time.time() * 1000), "images": images}
+
+
+class OCRStubHandler(BaseHTTPRequestHandler):
+    # keep-alive connection 유지
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self) -> None:
+        server: OCRStubServer = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        image_count = len(data.get("images", []))
+        with server._lock:
+            server.request_count += 1
+            server.image_count += image_count
+            server.batch_sizes[image_count] = server.batch_sizes.get(image_count, 0) + 1
+        if server.latency or server.per_image:
+            time.sleep(server.latency + server.per_image * image_count)
+        if server.token is not None and self.headers.get("X-OCR-SECRET") != server.token:
+            self._send(401, {"code": "0002", "message": "Authentication failed"})
+        elif server.max_images is not None and image_count > server.max_images:
+            self._send(400, {"code": "0011", "message": f"Too many images (max {server.max_images})"})
+        elif random.random() < server.fail_rate:
+            self._send(503, {"code": "0500", "message": "Service unavailable"})
+        else:
+            self._send(200, server.build_response(data))
+
+
+def start(host: str = "127.0.0.1", port: int = 0, **kwargs) -> OCRStubServer:
+    """stub 서버를 background thread로 실행하는 함수 (port 0이면 빈 port 사용)
+
+    Returns:
+        OCRStubServer: 실행중인 서버 (url 속성으로 주소 확인, shutdown()으로 종료)
+    """
+    server = OCRStubServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--response", help="저장된 OCR 응답 JSON 파일 (JSON_DIR_PATH)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--token")
+    parser.add_argument("--per-image-ms", type=float, default=0.0, help="요청 이미지당 추가 지연 시간")
+    parser.add_argument("--max-images", type=int, help="요청당 최대 이미지 수 (넘으면 400)")
+    args = parser.parse_args()
+    response = None
+    if args.response:
+        with open(args.response, encoding='utf-8') as file:
+            response = json.load(file)
+    server = OCRStubServer((args.host, args.port), response=response, latency_ms=args.latency_ms,
+                           fail_rate=args.fail_rate, token=args.token, per_image_ms=args.per_image_ms,
+                           max_images=args.max_images)
+    print(f"OCR stub listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from database import SessionLocal
+from dotenv import load_dotenv
+from models.song import Song
+from sqlalchemy import text
+from typing import Dict, List, Optional
+from yolov8.matcher import SequenceIndex
+load_dotenv()
+CATALOG_REFRESH_SEC = float(os.environ.get("CATALOG_REFRESH_SEC", 60))
+
+class CatalogSnapshot:
+    """
+    특정 시점의 곡 목록 Class
+    곡 제목 List, 제목별 곡 정보, 제목 검색 색인, /title/all 응답을 함께 보관
+    """
+    def __init__(self, version: int, titles: List[str], songs: Dict[str, Song], fingerprint: str) -> None:
+        self.version = version
+        self.titles = titles
+        self.songs = songs
+        self.fingerprint = fingerprint
+        # 내용이 같으면 프로세스, 재시작과 관계없이 같은 ETag
+        self.etag = f'"{fingerprint[:32]}"'
+        self.matcher = SequenceIndex(titles)
+        # /title/all 응답은 snapshot마다 한 번만 직렬화
+        self.title_body = json.dumps({"succsess": True, "data": titles}, ensure_ascii=False).encode('utf-8')
+
+
+class SongCatalog:
+    """
+    T_SONG 곡 목록을 메모리에 보관하는 Class
+    background thread가 CATALOG_REFRESH_SEC마다 T_SONG을 다시 읽고, 내용이 바뀐 경우에만 version을 올려 새 snapshot 생성
+    요청은 DB를 읽지 않고 현재 snapshot만 사용
+    """
+    def __init__(self, refresh_interval: float = CATALOG_REFRESH_SEC) -> None:
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._loaded: float = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.errors: int = 0
+
+    def _load(self) -> CatalogSnapshot:
+        db = SessionLocal()
+        try:
+            SELECT_QUERY = "SELECT DISTINCT T_SONG.TITLE FROM T_SONG"
+            titles = [title[0] for title in db.execute(text(SELECT_QUERY)).all()]
+            songs: Dict[str, Song] = {}
+            rows = []
+            for song in db.query(Song).all():
+                # get_song_information과 같이 제목별 첫 번째 곡 사용
+                songs.setdefault(song.TITLE, song)
+                rows.append([song.TITLE, song.AUTHOR, song.BPM, song.DIFFICULTY])
+            db.expunge_all()
+        finally:
+            db.close()
+        fingerprint = hashlib.sha256(json.dumps([titles, rows], ensure_ascii=False).encode('utf-8')).hexdigest()
+        current = self._snapshot
+        if current is not None and current.fingerprint == fingerprint:
+            return current
+        version = current.version + 1 if current is not None else 1
+        return CatalogSnapshot(version, titles, songs, fingerprint)
+
+    def refresh(self) -> CatalogSnapshot:
+        """T_SONG을 다시 읽는 함수
+
+        Returns:
+            CatalogSnapshot: 최신 곡 목록
+        """
+        with self._lock:
+            self._snapshot = self._load()
+            self._loaded = time.monotonic()
+            return self._snapshot
+
+    def start(self) -> None:
+        """갱신 thread 시작 함수 (서버 시작시 호출)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="song-catalog", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                # DB를 읽지 못하면 기존 snapshot을 유지하고 다음 주기에 다시 시도
+                self.errors += 1
+
+    def snapshot(self) -> CatalogSnapshot:
+        """현재 곡 목록 반환 함수 (처음 한 번만 DB를 읽고, 이후 갱신은 background thread에서 수행)
+
+        Returns:
+            CatalogSnapshot: 곡 목록
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        if self._thread is None and time.monotonic() - self._loaded >= self.refresh_interval:
+            # start를 호출하지 않은 경우(직접 실행한 script 등)에도 요청을 막지 않고 갱신
+            self.start()
+        return snapshot
+
+    def stats(self) -> dict:
+        """곡 목록 통계 반환 함수
+
+        Returns:
+            dict: version, 곡 수, 마지막 갱신 후 지난 시간(초), 갱신 실패 수
+        """
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot is not None else 0,
+            "titles": len(snapshot.titles) if snapshot is not None else 0,
+            "age_sec": time.monotonic() - self._loaded if snapshot is not None else 0.0,
+            "errors": self.errors,
+        }
+
+
+CATALOG = SongCatalog()
@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+from typing import Callable, Dict, List, Optional, Tuple, Union
+load_dotenv()
+ARTIFACT_QUEUE_SIZE = int(os.environ.get("ARTIFACT_QUEUE_SIZE", 64))
+# 저장을 기다리는 파일 데이터의 최대 크기 (큰 업로드가 몰려도 메모리를 이 이상 잡지 않음)
+ARTIFACT_QUEUE_MAX_BYTES = int(os.environ.get("ARTIFACT_QUEUE_MAX_BYTES", 256 * 1024 * 1024))
+# 보관 폴더별 최대 크기, 보관 기간(초), 정리 주기(초)
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 1024 * 1024 * 1024))
+ARTIFACT_MAX_AGE = float(os.environ.get("ARTIFACT_MAX_AGE", 7 * 24 * 60 * 60))
+ARTIFACT_SWEEP_INTERVAL = float(os.environ.get("ARTIFACT_SWEEP_INTERVAL", 10 * 60))
+
+
+class ArtifactSweeper:
+    """
+    보관 폴더의 파일을 주기적으로 정리하는 Class
+    보관 기간이 지난 파일을 지우고, 폴더 크기가 제한을 넘으면 오래된 파일부터 지움
+    writer가 저장한 크기를 누적하여 제한을 넘으면 주기를 기다리지 않고 바로 정리
+    """
+    def __init__(self, dir_paths: List[Optional[str]], max_bytes: int = ARTIFACT_MAX_BYTES,
+                 max_age: float = ARTIFACT_MAX_AGE, interval: float = ARTIFACT_SWEEP_INTERVAL) -> None:
+        self.dir_paths: List[str] = [os.path.abspath(dir_path) for dir_path in dir_paths if dir_path]
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self._bytes: Dict[str, int] = {dir_path: 0 for dir_path in self.dir_paths}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.removed: int = 0
+        self.freed: int = 0
+        self.sweep_count: int = 0
+        self.last_sweep_sec: float = 0.0
+
+    def start(self) -> None:
+        """정리 thread 시작 함수 (서버 시작시 호출)"""
+        with self._lock:
+            if not self.dir_paths or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="artifact-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def note(self, path: str, size: int) -> None:
+        """저장한 파일 크기를 누적하는 함수 (writer thread에서 호출)
+
+        Args:
+            path (str): 저장한 파일 위치
+            size (int): 파일 크기
+        """
+        dir_path = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            if dir_path not in self._bytes:
+                return
+            self._bytes[dir_path] += size
+            if self._bytes[dir_path] > self.max_bytes:
+                self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sweep()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sweep(self) -> int:
+        """보관 폴더 정리 함수
+
+        Returns:
+            int: 지운 파일 수
+        """
+        start = time.perf_counter()
+        expire = time.time() - self.max_age
+        removed = 0
+        for dir_path in self.dir_paths:
+            if not os.path.isdir(dir_path):
+                continue
+            files: List[Tuple[float, str, int]] = []
+            for entry in os.scandir(dir_path):
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.path, stat.st_size))
+                except OSError:
+                    continue
+            files.sort()
+            total = sum(size for _, _, size in files)
+            for mtime, path, size in files:
+                if mtime >= expire and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                self.freed += size
+            with self._lock:
+                self._bytes[dir_path] = total
+        self.removed += removed
+        self.sweep_count += 1
+        self.last_sweep_sec = time.perf_counter() - start
+        return removed
+
+    def stats(self) -> dict:
+        """정리 통계 반환 함수
+
+        Returns:
+            dict: 보관 폴더 전체 크기, 지운 파일 수/크기, 정리 횟수, 마지막 정리 시간
+        """
+        with self._lock:
+            total = sum(self._bytes.values())
+        return {"bytes": total, "removed": self.removed, "freed": self.freed, "sweep": self.sweep_count, "last_sweep_sec": self.last_sweep_sec}
+
+
+class ArtifactWriter:
+    """
+    업로드 원본, 감지 결과, OCR 이미지 등 보관용 파일을 background thread에서 저장하는 Class
+    queue의 파일 수나 대기 중인 데이터 크기가 제한을 넘으면 요청을 막지 않고 해당 파일 저장을 포기함
+    """
+    def __init__(self, max_queue: int = ARTIFACT_QUEUE_SIZE, sweeper: Optional[ArtifactSweeper] = None,
+                 max_bytes: int = ARTIFACT_QUEUE_MAX_BYTES) -> None:
+        self.sweeper = sweeper
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[Tuple[str, Union[bytes, Callable[[], bytes]], int]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._queued_bytes: int = 0
+        self.written: int = 0
+        self.dropped: int = 0
+        self.dropped_bytes: int = 0
+        self.failed: int = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, path: Optional[str], data: Union[bytes, Callable[[], bytes]], size: Optional[int] = None) -> bool:
+        """파일 저장 요청 함수
+
+        Args:
+            path (Optional[str]): 저장 위치, None이면 저장하지 않음
+            data (Union[bytes, Callable[[], bytes]]): 저장할 데이터 또는 writer thread에서 데이터를 만드는 함수
+            size (Optional[int], optional): 대기 중 잡고 있는 메모리 크기 (함수가 잡고 있는 데이터 크기). Defaults to len(data).
+
+        Returns:
+            bool: queue 등록 여부 (가득 찼거나 대기 중인 데이터가 max_bytes를 넘는 경우 False)
+        """
+        if path is None:
+            return False
+        if size is None:
+            size = 0 if callable(data) else len(data)
+        self._ensure_started()
+        with self._lock:
+            if self._queued_bytes + size > self.max_bytes:
+                self.dropped += 1
+                self.dropped_bytes += size
+                return False
+            self._queued_bytes += size
+        try:
+            self._queue.put_nowait((path, data, size))
+        except queue.Full:
+            with self._lock:
+                self._queued_bytes -= size
+                self.dropped += 1
+                self.dropped_bytes += size
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            path, data, size = self._queue.get()
+            try:
+                if callable(data):
+                    data = data()
+                with open(path, "wb") as writer:
+                    writer.write(data)
+                self.written += 1
+                if self.sweeper is not None:
+                    self.sweeper.note(path, len(data))
+            except Exception:
+                self.failed += 1
+            finally:
+                data = None
+                with self._lock:
+                    self._queued_bytes -= size
+                self._queue.task_done()
+
+    def join(self) -> None:
+        """queue에 남은 파일을 모두 저장할 때까지 기다리는 함수"""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        """저장 통계 반환 함수
+
+        Returns:
+            dict: 대기 중인 파일 수와 크기, 저장/포기/실패 횟수, 포기한 크기
+        """
+        with self._lock:
+            queued_bytes = self._queued_bytes
+        return {"queue": self._queue.qsize(), "queued_bytes": queued_bytes, "written": self.written,
+                "dropped": self.dropped, "dropped_bytes": self.dropped_bytes, "failed": self.failed}
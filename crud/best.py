@@ -0,0 +1,77 @@
+from models.song import Best
+from sqlalchemy import and_, case, func, or_, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Tuple
+
+BEST_COLUMNS: List[str] = ["RESULT", "SCORE", "SCORE_NUM", "SCORE_DETAIL", "DT"]
+# 사용자, 곡, 난이도별로 점수가 가장 높은 기록 (같은 점수면 먼저 기록한 것)과 기록 수
+BEST_QUERY = """
+INSERT INTO T_BEST (USERNAME, TITLE, DIFFICULTY, RESULT, SCORE, SCORE_NUM, SCORE_DETAIL, DT, PLAY_COUNT)
+SELECT USERNAME, TITLE, DIFFICULTY, RESULT, SCORE, SCORE_NUM, SCORE_DETAIL, DT, PLAY_COUNT FROM (
+    SELECT *,
+        ROW_NUMBER() OVER (PARTITION BY USERNAME, TITLE, DIFFICULTY ORDER BY SCORE_NUM DESC, DT ASC) AS RN,
+        COUNT(*) OVER (PARTITION BY USERNAME, TITLE, DIFFICULTY) AS PLAY_COUNT
+    FROM T_RECORD
+    WHERE DIFFICULTY IS NOT NULL {where}
+) WHERE RN = 1
+"""
+
+
+def add_bests(db: Session|Connection, rows: List[dict]) -> None:
+    """새 기록을 최고 기록에 반영하는 함수 (기록 저장과 같은 transaction에서 호출)
+    기존 최고 기록보다 점수가 높거나, 같은 점수를 더 먼저 기록한 경우에만 교체하고 기록 수는 항상 1 증가
+
+    Args:
+        db (Session|Connection): db Session
+        rows (List[dict]): T_RECORD에 새로 추가한 기록 (덮어쓴 기록은 refresh_bests 사용)
+    """
+    if not rows:
+        return
+    statement = insert(Best)
+    excluded = statement.excluded
+    better = or_(
+        func.coalesce(excluded.SCORE_NUM, -1) > func.coalesce(Best.SCORE_NUM, -1),
+        and_(func.coalesce(excluded.SCORE_NUM, -1) == func.coalesce(Best.SCORE_NUM, -1), excluded.DT < Best.DT),
+    )
+    set_ = {column: case((better, excluded[column]), else_=Best.__table__.c[column]) for column in BEST_COLUMNS}
+    set_["PLAY_COUNT"] = Best.PLAY_COUNT + 1
+    statement = statement.on_conflict_do_update(index_elements=[Best.USERNAME, Best.TITLE, Best.DIFFICULTY], set_=set_)
+    db.execute(statement, [
+        dict({column: row[column] for column in ["USERNAME", "TITLE", "DIFFICULTY", *BEST_COLUMNS]}, PLAY_COUNT=1)
+        for row in rows if row["DIFFICULTY"] is not None
+    ])
+
+
+def refresh_bests(db: Session|Connection, keys: Iterable[Tuple[str, str, str]]) -> None:
+    """(사용자, 곡, 난이도)의 최고 기록을 T_RECORD에서 다시 계산하는 함수
+    기존 기록을 덮어써서 점수가 내려갈 수 있는 경우에 사용
+
+    Args:
+        db (Session|Connection): db Session
+        keys (Iterable[Tuple[str, str, str]]): (USERNAME, TITLE, DIFFICULTY) List
+    """
+    params = [{"username": username, "title": title, "difficulty": difficulty} for username, title, difficulty in set(keys)
+              if difficulty is not None]
+    if not params:
+        return
+    db.execute(text("DELETE FROM T_BEST WHERE USERNAME = :username AND TITLE = :title AND DIFFICULTY = :difficulty"), params)
+    db.execute(text(BEST_QUERY.format(where="AND USERNAME = :username AND TITLE = :title AND DIFFICULTY = :difficulty")), params)
+
+
+def rebuild_bests(db: Session|Connection, user_name: Optional[str] = None) -> int:
+    """T_RECORD 전체(또는 한 사용자)에서 최고 기록 table을 다시 만드는 함수
+
+    Args:
+        db (Session|Connection): db Session
+        user_name (Optional[str], optional): 사용자 이름, None이면 전체. Defaults to None.
+
+    Returns:
+        int: 최고 기록 수
+    """
+    if user_name is None:
+        db.execute(text("DELETE FROM T_BEST"))
+        return db.execute(text(BEST_QUERY.format(where=""))).rowcount
+    db.execute(text("DELETE FROM T_BEST WHERE USERNAME = :username"), {"username": user_name})
+    return db.execute(text(BEST_QUERY.format(where="AND USERNAME = :username")), {"username": user_name}).rowcount
@@ -1,126 +1,410 @@
-import hashlib
+import asyncio
+import base64
+import json
 import os
+import tempfile
+import metrics
+import threading
+import uuid
 import yolov8.image as image
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from io import BytesIO
-from models.song import Song, Record, RecordItem
-from PIL import Image
+from models.song import Best, Song, Record, RecordItem, score_value
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
-from typing import List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from catalog import CATALOG
+from crud.artifact import ArtifactSweeper, ArtifactWriter
+from crud.best import add_bests, refresh_bests
+from crud.singleflight import UPLOAD_IDEMPOTENCY_MAX_ENTRIES, UPLOAD_IDEMPOTENCY_TTL, SingleFlight
+from crud.thumbnail import ThumbnailEntry, ThumbnailIndex
+from yolov8.batch import PredictBatcher
 from yolov8.ocr import req_OCR_data
-from yolov8.predict import predict, Predict
+from yolov8.ocr_client import OCRError
+from yolov8.predict import Predict
+from yolov8.video import VIDEO_SAMPLE_FPS, VideoResult, VideoScanner, read_video
+from yolov8.worker import DETECT_WORKERS, DetectPool
 load_dotenv()
 DETECT_DIR_PATH = os.environ.get("DETECT_DIR_PATH")
 OCR_READY_DIR_PATH = os.environ.get("OCR_READY_DIR_PATH")
 THUMBNAIL_DIR_PATH = os.environ.get("THUMBNAIL_DIR_PATH")
 UPLOAD_DIR_PATH = os.environ.get("UPLOAD_DIR_PATH")
 YOLO_MODEL_PATH = os.environ.get("YOLO_MODEL_PATH")
+MIN_DETECT_COUNT = 5
+VIDEO_MAX_BYTES = int(os.environ.get("VIDEO_MAX_BYTES", 2 * 1024 ** 3))
+VIDEO_CHUNK_SIZE = 1024 * 1024
+# 동시에 처리할 동영상 수 (나머지는 순서를 기다림)
+VIDEO_MAX_CONCURRENCY = int(os.environ.get("VIDEO_MAX_CONCURRENCY", 2))
+PREDICT_BATCHER = PredictBatcher(YOLO_MODEL_PATH)
+# DETECT_WORKERS > 0 이면 감지, OCR 이미지 생성을 worker 프로세스에서 수행
+DETECT_POOL = DetectPool(YOLO_MODEL_PATH, DETECT_WORKERS) if DETECT_WORKERS > 0 else None
+ARTIFACT_SWEEPER = ArtifactSweeper([UPLOAD_DIR_PATH, DETECT_DIR_PATH, OCR_READY_DIR_PATH])
+ARTIFACT_WRITER = ArtifactWriter(sweeper=ARTIFACT_SWEEPER)
+THUMBNAIL_INDEX = ThumbnailIndex(THUMBNAIL_DIR_PATH)
+# frame 읽기, decode 전용 thread (감지와 sync route가 쓰는 기본 executor와 분리)
+VIDEO_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, VIDEO_MAX_CONCURRENCY), thread_name_prefix="video")
+VIDEO_SEMAPHORE = asyncio.Semaphore(max(1, VIDEO_MAX_CONCURRENCY))
+# 같은 이미지 업로드(재전송)는 한 번만 처리
+UPLOAD_DEDUP = SingleFlight()
+# Idempotency-Key 요청 결과는 내용 hash 항목에 밀려나지 않도록 따로 보관
+UPLOAD_IDEMPOTENCY = SingleFlight(UPLOAD_IDEMPOTENCY_TTL, UPLOAD_IDEMPOTENCY_MAX_ENTRIES)
 
-def get_song_information(title:str, db:Session) -> Song:
+def get_song_information(title:str) -> Song:
     """곡 제목을 통해 곡 정보(제목, 작곡자, 난이도, BPM)를 찾는 함수
 
     Args:
         title (str): 곡 제목
-        db (Session): db Session
 
     Returns:
         Song: 검색 결과
     """
-    # SELECT_QUERY = "SELECT T_SONG.TITLE FROM T_SONG;"
-    return db.query(Song).filter(Song.TITLE == title).first()
+    # DB 대신 메모리의 곡 목록에서 검색
+    return CATALOG.snapshot().songs.get(title)
 
-def get_song_thumbnail(title:str, difficulty:str) -> Tuple[str, str]:
-    """곡 제목과 난이도 통해 곡 썸네일을 저장위치를 찾는 함수
+def get_song_thumbnail(title:str, difficulty:str, width: Optional[int]=None) -> Optional[ThumbnailEntry]:
+    """곡 제목과 난이도 통해 곡 썸네일 파일 정보를 찾는 함수
 
     Args:
         title (str): 곡 제목
         difficulty (str): 난이도
+        width (Optional[int], optional): 요청 너비 (축소본). Defaults to None.
+
+    Returns:
+        Optional[ThumbnailEntry]: 썸네일 파일 정보, 없으면 None
+    """
+    return THUMBNAIL_INDEX.get(title, difficulty, width)
+
+
+def _artifact_path(dir_path: str, file_name: str) -> str|None:
+    return os.path.join(dir_path, file_name) if dir_path else None
+
+
+def artifact_name(request_id: str) -> str:
+    """보관 파일 이름 생성 함수
+    요청 id는 client가 정할 수 있어 겹칠 수 있으므로 서버에서 만든 uuid를 앞에 붙임
+
+    Args:
+        request_id (str): 요청 id (X-Request-ID)
 
     Returns:
-        Tuple(str, str): sha256으로 암호화된 곡 제목, 썸네일 저장 위치
+        str: "{uuid}-{request_id}"
     """
-    title = hashlib.sha256(title.encode()).hexdigest()
-    image_path = f"{THUMBNAIL_DIR_PATH}\\{title}\\{difficulty}.jpg"
-    return title, image_path
+    return f"{uuid.uuid4().hex}-{request_id}"
 
 
-def image_predict(img_path: str) -> Tuple[Image.Image, Predict]:
-    """Yolov8로 객체를 찾는 함수
+async def image_predict(image_bytes: bytes) -> Tuple[Predict, bytes|None, Dict[str, Any]]:
+    """Yolov8로 객체를 찾고 OCR 이미지를 만드는 함수
+    숫자 항목은 로컬 OCR로 먼저 읽고, 읽지 못한 항목만 OCR 이미지에 포함
 
     Args:
-        img_path (str): 이미지 저장 위치
+        image_bytes (bytes): 업로드된 이미지
 
     Returns:
-        Tuple[Image.Image, Predict]: 원본 이미지, 감지한 결과
+        Tuple[Predict, bytes|None, Dict[str, Any]]: 감지한 결과, OCR 이미지 jpeg (감지 객체가 부족하면 None), 로컬 OCR 결과
     """
-    # 이미지 열기
-    img = Image.open(img_path)
-    # 이미지가 가로 > 세로면 오른쪽 90도로 꺽였다고 판단
-    width, height = img.size
-    if width > height:
-        img = img.rotate(270)
-    # 이미지에서 필요한 정보 좌표 가져오기
-    result = predict(YOLO_MODEL_PATH, img)
-    return img, result
+    if DETECT_POOL is not None:
+        result, ocr_ready, local = await DETECT_POOL.run(image_bytes, MIN_DETECT_COUNT)
+        # worker 프로세스의 model 재사용 여부는 결과에 담겨 오므로 부모 프로세스에서 기록
+        metrics.MODEL_HIT.inc("hit" if result.model_hit else "miss")
+        return result, ocr_ready, local
+    # 이미지 열기 (디스크를 거치지 않고 메모리에서 감지용 크기로 축소 decode)
+    img = await asyncio.to_thread(image.SourceImage, image_bytes)
+    # 이미지에서 필요한 정보 좌표 가져오기 (동시 요청과 묶어서 예측, 좌표는 원본 해상도로 변환)
+    result = img.to_full(await PREDICT_BATCHER.predict(img.detect_img))
+    metrics.MODEL_HIT.inc("hit" if result.model_hit else "miss")
+    if len(result) < MIN_DETECT_COUNT:
+        return result, None, {}
+    # 필요한 정보만 원본 해상도로 잘라 이어붙힌 OCR 이미지 만들기
+    ocr_ready, local, outcomes = await asyncio.to_thread(image.compose_local, img, result)
+    metrics.observe_local_ocr(outcomes)
+    return result, ocr_ready, local
 
 
-async def create_image_to_data(img:Image, result: Predict, image_name: str) -> List[dict]:
+async def create_image_to_data(ocr_ready: bytes, image_name: str, local: Optional[Dict[str, Any]] = None) -> List[dict]:
     """이미지를 데이터로 만드는 함수
 
     Args:
-        img (Image): 원본 이미지
-        result (Predict): Yolov8 예측 결과
+        ocr_ready (bytes): OCR 이미지 jpeg
         image_name (str): 이미지 이름 (uuid)
+        local (Optional[Dict[str, Any]], optional): 로컬 OCR 결과. Defaults to None.
 
     Returns:
         List[dict]: 결과 데이터
     """
-    # 필요한 정보 자르기
-    cutted_img = {}
-    for _, box in result.objects.items():
-        cutted_img[box.class_nm] = image.cut(img, box)
-    # 정보 이어붙히기
-    ocr_ready_image_size = image.calc_size(cutted_img)
-    ocr_ready_image = image.merge(cutted_img, ocr_ready_image_size)
-    ocr_ready_byte_image = BytesIO()
-    ocr_ready_image.save(ocr_ready_byte_image, "jpeg")
-    ocr_ready_image.save(f"{OCR_READY_DIR_PATH}\\{image_name}.jpg", "jpeg")
-    data = req_OCR_data(ocr_ready_byte_image, image_name)
+    data = await req_OCR_data(BytesIO(ocr_ready), image_name, local)
     return data
 
-def remove_detect_image(image_name: str, image_format: str):
-    """감지 실패시 저장한 이미지를 삭제하는 함수
+async def save_video(file: Any, suffix: str) -> Optional[str]:
+    """업로드된 동영상을 임시 파일로 저장하는 함수 (디스크 복사는 thread에서 수행)
+
+    Args:
+        file (Any): 업로드 파일 (UploadFile)
+        suffix (str): 임시 파일 확장자
+
+    Returns:
+        Optional[str]: 임시 파일 위치, VIDEO_MAX_BYTES보다 크면 None
+    """
+    return await asyncio.to_thread(_save_video, file.file, suffix)
+
+
+def _save_video(source: Any, suffix: str) -> Optional[str]:
+    # 업로드 임시 파일에서 VIDEO_CHUNK_SIZE씩 복사
+    size = 0
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=f".{suffix}", delete=False) as video_file:
+        while True:
+            chunk = source.read(VIDEO_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > VIDEO_MAX_BYTES:
+                break
+            video_file.write(chunk)
+    if size > VIDEO_MAX_BYTES:
+        os.remove(video_file.name)
+        return None
+    return video_file.name
+
+
+async def detect_frames(images: List[Any]) -> List[Predict]:
+    """동영상 frame 감지 함수, 업로드 감지와 같은 model을 같은 경로로 사용
+
+    Args:
+        images (List[Any]): 감지용 이미지 List
+
+    Returns:
+        List[Predict]: 이미지 순서대로 감지된 객체 List
+    """
+    if DETECT_POOL is not None:
+        return await DETECT_POOL.predict(images)
+    return await PREDICT_BATCHER.predict_many(images)
+
+
+async def video_to_data(video_path: str, request_id: str, sample_fps: float = VIDEO_SAMPLE_FPS) -> AsyncIterator[dict]:
+    """동영상에서 결과 화면을 찾아 찾는 대로 데이터로 만드는 함수
+    결과 화면마다 가장 잘 감지된 frame 하나만 OCR 이미지로 만들어 OCR 요청
+
+    Args:
+        video_path (str): 동영상 파일 위치
+        request_id (str): 요청 id (결과별 id는 "{request_id}-{index}")
+        sample_fps (float, optional): 초당 감지할 frame 수. Defaults to VIDEO_SAMPLE_FPS.
+
+    Yields:
+        AsyncIterator[dict]: 결과 화면별 결과
+    """
+    stop = threading.Event()
+    loop = asyncio.get_running_loop()
+    scanner = VideoScanner(None, MIN_DETECT_COUNT)
+    batches = scanner.batches(read_video(video_path, sample_fps, stop))
+    index = 0
+    async with VIDEO_SEMAPHORE:
+        try:
+            while True:
+                # frame 읽기와 decode만 동영상 전용 thread에서 수행하고, 감지는 event loop에서 기다림
+                # (thread가 감지를 기다리면 감지가 쓰는 executor thread가 모자라 멈출 수 있음)
+                batch = await loop.run_in_executor(VIDEO_EXECUTOR, next, batches, None)
+                if batch is None:
+                    found = scanner.finish()
+                    found_list = [found] if found is not None else []
+                else:
+                    images = [batch.pending[idx][1].detect_img for idx in batch.targets]
+                    found_list = scanner.apply(batch, await detect_frames(images) if images else [])
+                for found in found_list:
+                    item = {"index": index, "request_id": f"{request_id}-{index}", "timestamp": found.timestamp,
+                            "start": found.start, "end": found.end, "success": False}
+                    index += 1
+                    yield await _video_item(item, found)
+                if batch is None:
+                    break
+        finally:
+            # 요청이 끊기면 frame 읽기 중단
+            stop.set()
+
+
+async def _video_item(item: dict, found: VideoResult) -> dict:
+    # 결과 화면 하나를 OCR 요청하여 결과에 채움
+    if len(found.predict) < MIN_DETECT_COUNT:
+        item["detail"] = "Not enough detect data"
+        return item
+    ocr_ready, local, outcomes = await asyncio.to_thread(image.compose_local, found.image, found.predict)
+    metrics.observe_local_ocr(outcomes)
+    image_name = artifact_name(item["request_id"])
+    ARTIFACT_WRITER.submit(_artifact_path(OCR_READY_DIR_PATH, f"{image_name}.jpg"), ocr_ready)
+    try:
+        item["data"] = await create_image_to_data(ocr_ready, image_name, local)
+        item["success"] = True
+    except OCRError as err:
+        item["detail"] = str(err)
+    return item
+
+
+def archive_upload(image_name: str, image_format: str, image_bytes: bytes, result: Predict, ocr_ready: bytes):
+    """업로드 원본, 감지 결과, OCR 이미지를 background에서 보관하는 함수
 
     Args:
         image_name (str): 이미지 이름 (uuid)
         image_format (str): 이미지 포맷
+        image_bytes (bytes): 업로드된 이미지
+        result (Predict): Yolov8 예측 결과
+        ocr_ready (bytes): OCR 이미지 jpeg
     """
-    os.remove(f'{UPLOAD_DIR_PATH}\\{image_name}.{image_format}')
-    if os.path.exists(f'{DETECT_DIR_PATH}\\{image_name}.{image_format}'):
-        os.remove(f'{DETECT_DIR_PATH}\\{image_name}.{image_format}')
-    else:
-        os.remove(f'{DETECT_DIR_PATH}\\image0.jpg')
+    ARTIFACT_WRITER.submit(_artifact_path(UPLOAD_DIR_PATH, f"{image_name}.{image_format}"), image_bytes)
+    # 감지 결과 이미지는 writer thread에서 다시 decode하여 그림
+    ARTIFACT_WRITER.submit(_artifact_path(DETECT_DIR_PATH, f"{image_name}.jpg"), lambda: image.annotate(image.open_image(image_bytes), result),
+                           size=len(image_bytes))
+    ARTIFACT_WRITER.submit(_artifact_path(OCR_READY_DIR_PATH, f"{image_name}.jpg"), ocr_ready)
 
 def create_record(data: RecordItem, db: Session):
-    """기록을 저장하는 함수
+    """기록을 저장하고 최고 기록을 같은 transaction에서 갱신하는 함수
 
     Args:
         data (RecordItem): 기록 데이터 Class
         db (Session): db Session
     """
-    record = Record(**data.dict())
-    db.add(record)
+    row = dict(data.dict(), SCORE_NUM=score_value(data.SCORE))
+    db.add(Record(**row))
+    # 같은 기록이 이미 있으면 여기서 IntegrityError
+    db.flush()
+    add_bests(db, [row])
+    db.commit()
+
+def create_records(data: List[RecordItem], db: Session) -> int:
+    """여러 기록을 한 transaction으로 저장하는 함수
+    (TITLE, USERNAME, DT)가 같은 기록이 있으면 덮어씀
+
+    Args:
+        data (List[RecordItem]): 기록 데이터 Class List
+        db (Session): db Session
+
+    Returns:
+        int: 중복을 합친 뒤 추가하거나 덮어쓴 기록 수
+    """
+    if not data:
+        return 0
+    # 같은 기록이 여러 번 있으면 마지막 기록으로 저장됨
+    rows = list({(item.TITLE, item.USERNAME, item.DT): dict(item.dict(), SCORE_NUM=score_value(item.SCORE)) for item in data}.values())
+    # 덮어쓸 기록은 점수가 내려갈 수 있으므로 최고 기록을 다시 계산
+    keys = [(row["TITLE"], row["USERNAME"], row["DT"]) for row in rows]
+    overwritten = {(title, user_name, dt): difficulty for title, user_name, dt, difficulty in
+                   db.query(Record.TITLE, Record.USERNAME, Record.DT, Record.DIFFICULTY)
+                   .filter(tuple_(Record.TITLE, Record.USERNAME, Record.DT).in_(keys))}
+    statement = insert(Record)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Record.TITLE, Record.USERNAME, Record.DT],
+        set_={column: statement.excluded[column] for column in ["DIFFICULTY", "RESULT", "SCORE", "SCORE_NUM", "SCORE_DETAIL"]},
+    )
+    # list를 넘기면 executemany로 실행됨
+    db.execute(statement, rows)
+    add_bests(db, [row for row, key in zip(rows, keys) if key not in overwritten])
+    refresh_bests(db, [(user_name, title, difficulty) for (title, user_name, _), difficulty in overwritten.items()] +
+                  [(row["USERNAME"], row["TITLE"], row["DIFFICULTY"]) for row, key in zip(rows, keys) if key in overwritten])
     db.commit()
+    # upsert라 중복을 합친 기록은 모두 추가 또는 덮어쓰기됨
+    return len(rows)
 
-def get_record(user_name: str, db: Session) -> List[Record]:
-    """사용자의 기록을 검색하는 함수
+def encode_cursor(record: Record) -> str:
+    """다음 페이지 조회용 cursor 생성 함수
+
+    Args:
+        record (Record): 현재 페이지의 마지막 기록
+
+    Returns:
+        str: cursor
+    """
+    key = [record.SCORE_NUM, record.DT.isoformat(), record.TITLE]
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[int, datetime, str]:
+    """cursor 해석 함수
+
+    Args:
+        cursor (str): cursor
+
+    Raises:
+        ValueError: 잘못된 cursor
+
+    Returns:
+        Tuple[int, datetime, str]: 마지막 기록의 (숫자 점수, 기록 시간, 제목)
+    """
+    try:
+        score, dt, title = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(score), datetime.fromisoformat(dt), str(title)
+    except Exception as err:
+        raise ValueError("Invalid cursor") from err
+
+def get_record(user_name: str, db: Session, limit: int = 100, cursor: Optional[str] = None,
+               difficulty: Optional[str] = None, title: Optional[str] = None) -> Tuple[List[Record], Optional[str]]:
+    """사용자의 기록을 점수 내림차순으로 한 페이지씩 검색하는 함수
+
+    Args:
+        user_name (str): 사용자 이름
+        db (Session): db Session
+        limit (int, optional): 페이지 크기. Defaults to 100.
+        cursor (Optional[str], optional): 이전 페이지의 next cursor. Defaults to None.
+        difficulty (Optional[str], optional): 난이도 filter. Defaults to None.
+        title (Optional[str], optional): 곡 제목 filter. Defaults to None.
+
+    Returns:
+        Tuple[List[Record], Optional[str]]: 사용자 기록 List, 다음 페이지 cursor (마지막 페이지면 None)
+    """
+    query = db.query(Record).filter(Record.USERNAME == user_name)
+    if difficulty is not None:
+        query = query.filter(Record.DIFFICULTY == difficulty)
+    if title is not None:
+        query = query.filter(Record.TITLE == title)
+    if cursor is not None:
+        # keyset pagination: 마지막 기록보다 뒤에 오는 기록만 검색
+        query = query.filter(tuple_(Record.SCORE_NUM, Record.DT, Record.TITLE) < tuple_(*decode_cursor(cursor)))
+    result = query.order_by(Record.SCORE_NUM.desc(), Record.DT.desc(), Record.TITLE.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(result[limit - 1]) if len(result) > limit else None
+    return result[:limit], next_cursor
+
+def get_best(user_name: str, db: Session, limit: int = 100, cursor: Optional[str] = None,
+             difficulty: Optional[str] = None, title: Optional[str] = None) -> Tuple[List[Best], Optional[str]]:
+    """사용자의 곡, 난이도별 최고 기록을 점수 내림차순으로 한 페이지씩 검색하는 함수
 
     Args:
         user_name (str): 사용자 이름
         db (Session): db Session
+        limit (int, optional): 페이지 크기. Defaults to 100.
+        cursor (Optional[str], optional): 이전 페이지의 next cursor. Defaults to None.
+        difficulty (Optional[str], optional): 난이도 filter. Defaults to None.
+        title (Optional[str], optional): 곡 제목 filter. Defaults to None.
+
+    Returns:
+        Tuple[List[Best], Optional[str]]: 최고 기록 List, 다음 페이지 cursor (마지막 페이지면 None)
+    """
+    query = db.query(Best).filter(Best.USERNAME == user_name)
+    if difficulty is not None:
+        query = query.filter(Best.DIFFICULTY == difficulty)
+    if title is not None:
+        query = query.filter(Best.TITLE == title)
+    if cursor is not None:
+        # 한 사용자의 같은 곡 기록은 시간이 모두 다르므로 (점수, 시간, 제목)으로 순서가 정해짐
+        query = query.filter(tuple_(Best.SCORE_NUM, Best.DT, Best.TITLE) < tuple_(*decode_cursor(cursor)))
+    result = query.order_by(Best.SCORE_NUM.desc(), Best.DT.desc(), Best.TITLE.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(result[limit - 1]) if len(result) > limit else None
+    return result[:limit], next_cursor
+
+def get_ranking(title: str, difficulty: str, db: Session, limit: int = 100) -> List[dict]:
+    """곡, 난이도별 사용자 최고 기록 순위를 검색하는 함수
+
+    Args:
+        title (str): 곡 제목
+        difficulty (str): 난이도
+        db (Session): db Session
+        limit (int, optional): 검색할 순위 수. Defaults to 100.
 
     Returns:
-        List[Record]: 사용자 기록 List
+        List[dict]: 순위 List (점수가 같으면 같은 순위, 먼저 기록한 사용자가 앞)
     """
-    result = db.query(Record).filter(Record.USERNAME == user_name).order_by(Record.SCORE.desc(), Record.TITLE.desc(), Record.DT.desc()).all()
-    return result
+    rank = func.rank().over(order_by=Best.SCORE_NUM.desc()).label("RANK")
+    result = (db.query(Best, rank)
+              .filter(Best.TITLE == title, Best.DIFFICULTY == difficulty)
+              .order_by(Best.SCORE_NUM.desc(), Best.DT.asc(), Best.USERNAME.asc())
+              .limit(limit).all())
+    return [{"RANK": rank, "USERNAME": best.USERNAME, "RESULT": best.RESULT, "SCORE": best.SCORE,
+             "SCORE_DETAIL": best.SCORE_DETAIL, "DT": best.DT, "PLAY_COUNT": best.PLAY_COUNT} for best, rank in result]
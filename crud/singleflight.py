@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+load_dotenv()
+# 같은 업로드의 결과를 재사용하는 시간(초)과 최대 항목 수
+UPLOAD_DEDUP_TTL = float(os.environ.get("UPLOAD_DEDUP_TTL", 60))
+UPLOAD_DEDUP_MAX_ENTRIES = int(os.environ.get("UPLOAD_DEDUP_MAX_ENTRIES", 1024))
+# Idempotency-Key로 요청한 결과를 보관하는 시간(초)과 최대 항목 수
+UPLOAD_IDEMPOTENCY_TTL = float(os.environ.get("UPLOAD_IDEMPOTENCY_TTL", 24 * 60 * 60))
+UPLOAD_IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("UPLOAD_IDEMPOTENCY_MAX_ENTRIES", 10000))
+
+
+class KeyConflict(Exception):
+    """같은 key를 다른 요청 내용으로 다시 사용했을 때 발생하는 예외"""
+
+
+class SingleFlight:
+    """
+    같은 key의 동시 요청을 한 번만 처리하고 결과를 나눠주는 Class
+    처리 중인 key로 요청이 오면 먼저 온 요청의 결과를 기다리고,
+    성공한 결과는 ttl 동안 보관하여 같은 key의 재요청에 바로 돌려줌
+    key와 함께 요청 내용 hash(digest)를 보관하여, 같은 key에 다른 내용이 오면 KeyConflict 발생
+    """
+    def __init__(self, ttl: float = UPLOAD_DEDUP_TTL, max_entries: int = UPLOAD_DEDUP_MAX_ENTRIES) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (요청 내용 hash, 처리 중인 task)
+        self._running: Dict[str, Tuple[Optional[str], asyncio.Task]] = {}
+        # key -> (만료 시간, 요청 내용 hash, 결과), 오래된 순서
+        self._recent: OrderedDict[str, Tuple[float, Optional[str], Any]] = OrderedDict()
+        self.leader: int = 0
+        self.shared: int = 0
+        self.recent_hit: int = 0
+        self.conflict: int = 0
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        """업로드 내용으로 key 생성 함수
+
+        Args:
+            data (bytes): 업로드된 이미지
+
+        Returns:
+            str: sha256 hex
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def _get_recent(self, key: str) -> Tuple[bool, Optional[str], Any]:
+        entry = self._recent.get(key)
+        if entry is None:
+            return False, None, None
+        if entry[0] < time.monotonic():
+            del self._recent[key]
+            return False, None, None
+        return True, entry[1], entry[2]
+
+    def _put_recent(self, key: str, digest: Optional[str], result: Any, ttl: float) -> None:
+        self._recent.pop(key, None)
+        self._recent[key] = (time.monotonic() + ttl, digest, result)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    def _check(self, digest: Optional[str], stored: Optional[str]) -> None:
+        if digest != stored:
+            self.conflict += 1
+            raise KeyConflict("Key was already used with a different request body")
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]], digest: Optional[str] = None) -> Tuple[Any, str]:
+        """key의 결과를 처리하거나 기다리는 함수
+
+        Args:
+            key (str): 요청 key (업로드 내용 hash 또는 Idempotency-Key)
+            func (Callable[[], Awaitable[Any]]): 처리 함수
+            digest (Optional[str], optional): 요청 내용 hash (Idempotency-Key 사용시). Defaults to None.
+
+        Raises:
+            KeyConflict: 같은 key로 처리 중이거나 보관된 요청과 digest가 다른 경우
+
+        Returns:
+            Tuple[Any, str]: 결과, 처리 방법 ("leader": 직접 처리, "shared": 처리 중인 요청 결과, "recent": 보관된 결과)
+        """
+        found, stored, result = self._get_recent(key)
+        if found:
+            self._check(digest, stored)
+            self.recent_hit += 1
+            return result, "recent"
+        running = self._running.get(key)
+        if running is not None:
+            self._check(digest, running[0])
+            self.shared += 1
+            # 먼저 온 요청이 끊겨도 처리는 계속되도록 shield로 기다림
+            return await asyncio.shield(running[1]), "shared"
+        self.leader += 1
+        task = asyncio.get_running_loop().create_task(func())
+        self._running[key] = (digest, task)
+
+        def done(task: asyncio.Task) -> None:
+            self._running.pop(key, None)
+            # 성공한 결과만 보관 (실패는 재요청시 다시 처리)
+            if not task.cancelled() and task.exception() is None and self.max_entries > 0:
+                self._put_recent(key, digest, task.result(), self.ttl)
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task), "leader"
+
+    def stats(self) -> dict:
+        """중복 제거 통계 반환 함수
+
+        Returns:
+            dict: 처리 중인 key 수, 보관 중인 결과 수, 직접 처리/공유/보관 결과 재사용/key 충돌 횟수
+        """
+        return {"running": len(self._running), "recent": len(self._recent), "leader": self.leader, "shared": self.shared,
+                "recent_hit": self.recent_hit, "conflict": self.conflict}
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from PIL import Image
+from typing import Dict, List, Optional, Tuple
+load_dotenv()
+THUMBNAIL_DIR_PATH = os.environ.get("THUMBNAIL_DIR_PATH")
+# 축소본 cache 폴더, 기본값은 썸네일 폴더 아래 .cache
+THUMBNAIL_CACHE_DIR_PATH = os.environ.get("THUMBNAIL_CACHE_DIR_PATH", os.path.join(THUMBNAIL_DIR_PATH, ".cache") if THUMBNAIL_DIR_PATH else None)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+THUMBNAIL_WIDTHS: List[int] = sorted(int(width) for width in os.environ.get("THUMBNAIL_WIDTHS", "64,128,256").split(","))
+# 색인의 원본 파일 정보를 다시 stat하기 전까지 사용하는 시간(초)
+THUMBNAIL_REVALIDATE_SEC = float(os.environ.get("THUMBNAIL_REVALIDATE_SEC", 30))
+
+class ThumbnailEntry:
+    """
+    썸네일 파일 정보 Class
+    파일 위치, 크기, 수정 시간과 캐시 검증용 header 값을 저장
+    """
+    def __init__(self, path: str, size: int, mtime: float) -> None:
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.etag = f'"{int(mtime * 1000):x}-{size:x}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+    def headers(self) -> Dict[str, str]:
+        return {"ETag": self.etag, "Last-Modified": self.last_modified, "Cache-Control": "public, max-age=86400"}
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """조건부 요청에 304로 응답할 수 있는지 확인하는 함수
+
+        Args:
+            if_none_match (Optional[str]): If-None-Match header
+            if_modified_since (Optional[str]): If-Modified-Since header
+
+        Returns:
+            bool: 304 응답 여부
+        """
+        if if_none_match is not None:
+            # If-None-Match가 있으면 If-Modified-Since는 무시
+            return bool({self.etag, "*"} & {etag.strip() for etag in if_none_match.split(",")})
+        if if_modified_since is not None:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+@lru_cache(maxsize=4096)
+def title_hash(title: str) -> str:
+    return hashlib.sha256(title.encode()).hexdigest()
+
+
+class ThumbnailIndex:
+    """
+    (곡 제목, 난이도) -> 썸네일 파일 정보 색인 Class
+    서버 시작시 THUMBNAIL_DIR_PATH를 한 번 읽어 색인을 만들고, 항목이 revalidate_sec보다 오래되면 원본 파일을 다시 stat하여 갱신
+    너비별 축소본(?w=128)은 처음 요청될 때 만들어 크기 제한이 있는 disk cache에 보관
+    축소본 파일 이름에 원본 수정 시간을 넣어 원본이 바뀌면 (수정 시간이 이전으로 돌아가도) 새로 만듦
+    색인 lock은 조회, 등록에만 사용하고 축소본 생성은 축소본별 lock으로 한 번만 수행
+    """
+    def __init__(self, dir_path: Optional[str] = THUMBNAIL_DIR_PATH, cache_dir_path: Optional[str] = THUMBNAIL_CACHE_DIR_PATH,
+                 cache_max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES, widths: List[int] = THUMBNAIL_WIDTHS,
+                 revalidate_sec: float = THUMBNAIL_REVALIDATE_SEC) -> None:
+        self.dir_path = dir_path
+        self.cache_dir_path = cache_dir_path
+        self.cache_max_bytes = cache_max_bytes
+        self.widths = widths
+        self.revalidate_sec = revalidate_sec
+        # (제목 hash, 난이도) -> (마지막 stat 시간, 원본 파일 정보)
+        self._entries: Dict[Tuple[str, str], Tuple[float, ThumbnailEntry]] = {}
+        # (제목 hash, 난이도, 너비) -> (원본 version, 축소본 파일 정보)
+        self._variants: OrderedDict[Tuple[str, str, int], Tuple[str, ThumbnailEntry]] = OrderedDict()
+        self._variant_bytes: int = 0
+        self._variant_locks: Dict[Tuple[str, str, int], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _stat(self, path: str) -> Optional[ThumbnailEntry]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return ThumbnailEntry(path, stat.st_size, stat.st_mtime)
+
+    @staticmethod
+    def _version(original: ThumbnailEntry) -> str:
+        # 원본 ETag와 같은 값 (수정 시간, 크기)
+        return original.etag.strip('"')
+
+    def build(self) -> None:
+        """썸네일 폴더와 축소본 cache 폴더를 읽어 색인을 만드는 함수"""
+        entries: Dict[Tuple[str, str], ThumbnailEntry] = {}
+        if self.dir_path is not None and os.path.isdir(self.dir_path):
+            for title_dir in os.scandir(self.dir_path):
+                if not title_dir.is_dir() or title_dir.name.startswith("."):
+                    continue
+                for file in os.scandir(title_dir.path):
+                    difficulty, ext = os.path.splitext(file.name)
+                    if ext == ".jpg":
+                        stat = file.stat()
+                        entries[(title_dir.name, difficulty)] = ThumbnailEntry(file.path, stat.st_size, stat.st_mtime)
+        variants = []
+        if self.cache_dir_path is not None and os.path.isdir(self.cache_dir_path):
+            for title_dir in os.scandir(self.cache_dir_path):
+                if not title_dir.is_dir():
+                    continue
+                for file in os.scandir(title_dir.path):
+                    name, ext = os.path.splitext(file.name)
+                    rest, _, version = name.rpartition("_")
+                    difficulty, _, width = rest.rpartition("_")
+                    if ext != ".jpg":
+                        continue
+                    original = entries.get((title_dir.name, difficulty))
+                    if not width.isdigit() or original is None or version != self._version(original):
+                        # 원본이 바뀌었거나 없어진 축소본, 이전 형식({난이도}_{너비}.jpg) 축소본은 지움
+                        try:
+                            os.remove(file.path)
+                        except OSError:
+                            pass
+                        continue
+                    stat = file.stat()
+                    variants.append((stat.st_atime, (title_dir.name, difficulty, int(width)), version, ThumbnailEntry(file.path, stat.st_size, stat.st_mtime)))
+        checked = time.monotonic()
+        with self._lock:
+            self._entries = {key: (checked, entry) for key, entry in entries.items()}
+            self._variants = OrderedDict((key, (version, entry)) for _, key, version, entry in sorted(variants, key=lambda variant: variant[0]))
+            self._variant_bytes = sum(entry.size for _, entry in self._variants.values())
+            self._evict()
+
+    def _original(self, hashed: str, difficulty: str) -> Optional[ThumbnailEntry]:
+        if self.dir_path is None or os.path.basename(difficulty) != difficulty:
+            return None
+        key = (hashed, difficulty)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and now - cached[0] < self.revalidate_sec:
+            return cached[1]
+        # 서버 시작 후 추가, 교체, 삭제된 썸네일은 revalidate_sec마다 다시 stat하여 반영
+        current = self._stat(os.path.join(self.dir_path, hashed, f"{difficulty}.jpg"))
+        entry = cached[1] if cached is not None else None
+        if current is None or entry is None or entry.mtime != current.mtime or entry.size != current.size:
+            entry = current
+        with self._lock:
+            if entry is None:
+                # 없는 썸네일은 요청마다 다른 이름이 올 수 있으므로 색인에 남기지 않음
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (now, entry)
+        return entry
+
+    def _bucket(self, width: Optional[int]) -> Optional[int]:
+        if width is None:
+            return None
+        for bucket in self.widths:
+            if width <= bucket:
+                return bucket
+        return None
+
+    def _evict(self) -> None:
+        while self._variant_bytes > self.cache_max_bytes and self._variants:
+            _, (_, entry) = self._variants.popitem(last=False)
+            self._variant_bytes -= entry.size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _variant(self, hashed: str, difficulty: str, width: int, original: ThumbnailEntry) -> ThumbnailEntry:
+        key = (hashed, difficulty, width)
+        version = self._version(original)
+        with self._lock:
+            cached = self._lookup(key, version)
+            if cached is not None:
+                return cached
+            variant_lock = self._variant_locks.setdefault(key, threading.Lock())
+        # 같은 축소본의 동시 요청은 먼저 온 요청이 만들 때까지 기다리고, 다른 썸네일 요청은 막지 않음
+        with variant_lock:
+            with self._lock:
+                cached = self._lookup(key, version)
+                if cached is not None:
+                    return cached
+            with Image.open(original.path) as img:
+                if img.width <= width:
+                    return original
+                img = img.convert("RGB")
+                img.thumbnail((width, img.height * width // img.width))
+                path = os.path.join(self.cache_dir_path, hashed, f"{difficulty}_{width}_{version}.jpg")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                img.save(path, "jpeg", quality=85)
+            entry = self._stat(path)
+            with self._lock:
+                stale = self._variants.pop(key, None)
+                if stale is not None:
+                    self._variant_bytes -= stale[1].size
+                self._variants[key] = (version, entry)
+                self._variant_bytes += entry.size
+                self._evict()
+            if stale is not None and stale[1].path != path:
+                # 이전 원본으로 만든 축소본
+                try:
+                    os.remove(stale[1].path)
+                except OSError:
+                    pass
+            return entry
+
+    def _lookup(self, key: Tuple[str, str, int], version: str) -> Optional[ThumbnailEntry]:
+        # self._lock을 잡은 상태에서 호출
+        cached = self._variants.get(key)
+        if cached is None or cached[0] != version:
+            return None
+        self._variants.move_to_end(key)
+        return cached[1]
+
+    def get(self, title: str, difficulty: str, width: Optional[int] = None) -> Optional[ThumbnailEntry]:
+        """곡 제목과 난이도로 썸네일을 찾는 함수
+
+        Args:
+            title (str): 곡 제목
+            difficulty (str): 난이도
+            width (Optional[int], optional): 요청 너비, THUMBNAIL_WIDTHS 단위로 올림. Defaults to None.
+
+        Returns:
+            Optional[ThumbnailEntry]: 썸네일 파일 정보, 없으면 None
+        """
+        hashed = title_hash(title)
+        original = self._original(hashed, difficulty)
+        if original is None:
+            return None
+        bucket = self._bucket(width)
+        if bucket is None or self.cache_dir_path is None:
+            return original
+        return self._variant(hashed, difficulty, bucket, original)
@@ -1,9 +1,40 @@
-from sqlalchemy import create_engine, text
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+load_dotenv()
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 30))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+
+def create_db_engine(db_url: str) -> Engine:
+    """SQLite engine 생성 함수
+    WAL mode로 읽기와 쓰기가 서로 막지 않게 하고, 잠금 대기 시간(busy timeout)을 설정
+
+    Args:
+        db_url (str): DB 주소
+
+    Returns:
+        Engine: DB engine
+    """
+    engine = create_engine(db_url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT, "check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+        # WAL에서는 NORMAL이어도 DB가 깨지지 않음 (전원 차단시 마지막 commit만 유실 가능)
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-16000")
+        cursor.close()
+
+    return engine
 
 DB_URL = f'sqlite:///./sound_voltex.db'
-engine = create_engine(DB_URL)
+engine = create_db_engine(DB_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Dependency
@@ -24,4 +55,4 @@ def get_song_title():
     db.close()
     return title_list
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -1,8 +1,14 @@
+import os
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # Routers
-from routers import default
+import crud.default as crud
+import metrics
+from catalog import CATALOG
+from migrate import migrate
+from routers import default, monitor
+from yolov8.predict import MODEL_REGISTRY
 
 load_dotenv()
 app = FastAPI()
@@ -14,4 +20,42 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.TraceMiddleware)
 app.include_router(default.router, prefix="/api/v1")
+app.include_router(monitor.router)
+
+
+@app.on_event("startup")
+def load_index():
+    migrate()
+    CATALOG.refresh()
+    CATALOG.start()
+    crud.THUMBNAIL_INDEX.build()
+    # 보관 파일(업로드 원본, 감지 결과, OCR 이미지) 정리 시작
+    crud.ARTIFACT_SWEEPER.start()
+
+
+@app.on_event("startup")
+def load_model():
+    # worker 시작시 model을 불러오고 warmup (첫 요청에서 model 생성 비용 방지)
+    if crud.DETECT_POOL is not None:
+        # 감지는 worker 프로세스에서 수행하므로 프로세스마다 model을 불러옴
+        crud.DETECT_POOL.start()
+    else:
+        MODEL_REGISTRY.load(os.environ.get("YOLO_MODEL_PATH"))
+
+
+@app.on_event("shutdown")
+def stop_detect_pool():
+    if crud.DETECT_POOL is not None:
+        crud.DETECT_POOL.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_artifact_sweeper():
+    crud.ARTIFACT_SWEEPER.stop()
+
+
+@app.on_event("shutdown")
+def stop_catalog():
+    CATALOG.stop()
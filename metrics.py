@@ -0,0 +1,212 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("sdvx.trace")
+# 요청별 단계 처리 시간 (trace)
+_TRACE: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("trace", default=None)
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATIO_BUCKETS: Tuple[float, ...] = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    Prometheus counter Class
+    """
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in self._values.items():
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram Class
+    bucket 경계는 고정하고, 관측값은 bucket별 개수로만 저장
+    """
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label 값 -> (bucket별 개수, 합계, 개수)
+        self._values: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    metric 보관 Class
+    Counter/Histogram과 각 모듈의 stats() 값을 Prometheus text 형식으로 출력
+    """
+    def __init__(self) -> None:
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, prefix: str, stats: Callable[[], dict]) -> None:
+        """stats() 함수의 숫자 값을 gauge로 출력하도록 등록하는 함수
+
+        Args:
+            prefix (str): metric 이름 앞부분
+            stats (Callable[[], dict]): 통계 반환 함수
+        """
+        self._collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._collectors:
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("sdvx_stage_seconds", "Upload pipeline stage latency", ("stage",))
+DETECT_FAIL = REGISTRY.counter("sdvx_detect_fail_total", "Uploads rejected for not enough detected objects")
+OCR_FIELD_FALLBACK = REGISTRY.counter("sdvx_ocr_field_fallback_total", "OCR field values repaired or replaced by post_process", ("field",))
+LOCAL_OCR = REGISTRY.counter("sdvx_local_ocr_total", "Fields read by the local OCR backend or sent to remote OCR", ("field", "outcome"))
+MODEL_HIT = REGISTRY.counter("sdvx_model_requests_total", "Detections served by an already loaded model (hit) or one loaded for the request (miss)", ("outcome",))
+VIDEO_FRAMES = REGISTRY.counter("sdvx_video_frames_total", "Sampled video frames sent to the detector or reusing the previous detection", ("outcome",))
+VIDEO_RESULTS = REGISTRY.counter("sdvx_video_results_total", "Result screens found in uploaded videos")
+TITLE_MATCH_RATIO = REGISTRY.histogram("sdvx_title_match_ratio", "Similarity of OCR title to the matched song title", buckets=RATIO_BUCKETS)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """단계 처리 시간을 기록하는 함수 (histogram + 현재 요청 trace)
+
+    Args:
+        stage (str): 단계 이름
+        seconds (float): 처리 시간
+    """
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+
+def observe_stages(timings: Dict[str, float]) -> None:
+    """다른 프로세스에서 측정한 단계 처리 시간을 기록하는 함수
+
+    Args:
+        timings (Dict[str, float]): 단계별 처리 시간
+    """
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+def observe_local_ocr(outcomes: Dict[str, str]) -> None:
+    """로컬 OCR 항목별 결과를 기록하는 함수 (worker 프로세스에서 읽은 결과도 부모 프로세스에서 기록)
+
+    Args:
+        outcomes (Dict[str, str]): class 이름 -> 결과 ("local" 또는 "fallback")
+    """
+    for field, outcome in outcomes.items():
+        LOCAL_OCR.inc(field, outcome)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """with 구문 안의 처리 시간을 단계 이름으로 기록하는 함수
+
+    Args:
+        name (str): 단계 이름
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """요청 하나의 단계별 처리 시간을 모으는 함수
+
+    Returns:
+        Dict[str, float]: 단계별 처리 시간
+    """
+    timings: Dict[str, float] = {}
+    token = _TRACE.set(timings)
+    try:
+        yield timings
+    finally:
+        _TRACE.reset(token)
+
+
+class TraceMiddleware:
+    """
+    요청마다 단계별 처리 시간을 모아 log로 남기는 ASGI middleware
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        with trace() as timings:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                if timings:
+                    stages = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timings.items())
+                    logger.info("%s %s %.1fms %s", scope["method"], scope["path"], (time.perf_counter() - start) * 1000, stages)
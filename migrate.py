@@ -0,0 +1,82 @@
+"""DB schema 보정 스크립트
+
+기존 sound_voltex.db에 새 column, index, table을 추가하고 값을 채움 (여러 번 실행해도 안전)
+서버 시작시 자동으로 실행되며 직접 실행할 수도 있음
+
+    python migrate.py
+    python migrate.py --rebuild-bests            # T_RECORD에서 최고 기록 table(T_BEST)을 다시 만듦
+    python migrate.py --rebuild-bests --user foo
+"""
+import argparse
+from crud.best import rebuild_bests
+from database import Base, engine
+from models.song import Best, Record, score_value
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from typing import Set
+BACKFILL_BATCH = 1000
+
+
+def backfill_score_num(conn: Connection, batch: int = BACKFILL_BATCH) -> Set[str]:
+    """SCORE_NUM이 비었거나 SCORE에 숫자 외 문자가 있는 기록의 SCORE_NUM을 score_value로 채우는 함수
+    저장할 때와 같은 방법(숫자만 남김)으로 계산하며 batch개씩 나누어 갱신
+
+    Args:
+        conn (Connection): DB 연결
+        batch (int, optional): 한 번에 갱신할 기록 수. Defaults to BACKFILL_BATCH.
+
+    Returns:
+        Set[str]: SCORE_NUM이 바뀐 사용자 이름
+    """
+    users: Set[str] = set()
+    last_rowid = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT rowid, SCORE, SCORE_NUM, USERNAME FROM T_RECORD "
+            "WHERE rowid > :last_rowid AND (SCORE_NUM IS NULL OR SCORE GLOB '*[^0-9]*') ORDER BY rowid LIMIT :batch"
+        ), {"last_rowid": last_rowid, "batch": batch}).all()
+        if not rows:
+            return users
+        last_rowid = rows[-1][0]
+        updates = [{"rowid": rowid, "score_num": score_value(score)} for rowid, score, score_num, _ in rows if score_num != score_value(score)]
+        if updates:
+            conn.execute(text("UPDATE T_RECORD SET SCORE_NUM = :score_num WHERE rowid = :rowid"), updates)
+            users.update(user_name for _, score, score_num, user_name in rows if score_num != score_value(score))
+
+
+def migrate(bind: Engine = engine):
+    """없는 table, column, index를 만드는 함수
+
+    Args:
+        bind (Engine): DB engine
+    """
+    has_best = inspect(bind).has_table(Best.__tablename__)
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(T_RECORD)"))}
+        if "SCORE_NUM" not in columns:
+            conn.execute(text("ALTER TABLE T_RECORD ADD COLUMN SCORE_NUM INTEGER"))
+        # 새 column을 채우고, 이전 CAST로 잘못 채운 값("9,876,543" -> 9)도 바로잡음
+        users = backfill_score_num(conn)
+        # create_all은 이미 있는 table의 index를 만들지 않음
+        for index in Record.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        if not has_best:
+            # 새로 만든 최고 기록 table은 기존 기록으로 채움
+            rebuild_bests(conn)
+        else:
+            # SCORE_NUM이 바뀐 사용자의 최고 기록은 다시 계산
+            for user_name in users:
+                rebuild_bests(conn, user_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild-bests", action="store_true", help="T_RECORD에서 최고 기록 table을 다시 만듦")
+    parser.add_argument("--user", help="--rebuild-bests 대상 사용자 (없으면 전체)")
+    args = parser.parse_args()
+    migrate()
+    if args.rebuild_bests:
+        with engine.begin() as conn:
+            count = rebuild_bests(conn, args.user)
+        print(f"rebuilt {count} bests")
@@ -1,5 +1,6 @@
+import re
 from datetime import datetime
-from sqlalchemy import TEXT, Column, VARCHAR, DATETIME
+from sqlalchemy import TEXT, Column, Index, INTEGER, VARCHAR, DATETIME
 from pydantic import BaseModel
 # from pydantic import BaseModel
 from database import Base
@@ -12,6 +13,17 @@ class Song(Base):
     BPM = Column(VARCHAR)
     DIFFICULTY = Column(TEXT)
 
+def score_value(score: str) -> int:
+    """문자열 점수를 숫자로 바꾸는 함수 (Record.SCORE_NUM 값)
+
+    Args:
+        score (str): 점수
+
+    Returns:
+        int: 숫자 점수 (숫자가 없으면 0)
+    """
+    return int(re.sub(r'[^0-9]', '', score or '') or 0)
+
 class Record(Base):
     __tablename__ = "T_RECORD"
 
@@ -19,10 +31,37 @@ class Record(Base):
     DIFFICULTY = Column(VARCHAR)
     RESULT = Column(VARCHAR)
     SCORE = Column(VARCHAR)
+    # 정렬, 페이지 조회용 숫자 점수 (SCORE는 문자열이라 사전순 정렬됨)
+    SCORE_NUM = Column(INTEGER)
     SCORE_DETAIL = Column(VARCHAR)
     USERNAME = Column(VARCHAR, primary_key=True)
     DT = Column(DATETIME, primary_key=True)
 
+    __table_args__ = (
+        Index("IX_T_RECORD_USERNAME_SCORE_NUM_DT", "USERNAME", "SCORE_NUM", "DT"),
+    )
+
+
+class Best(Base):
+    # T_RECORD에서 사용자, 곡, 난이도별 최고 기록만 모은 table (기록 저장시 같은 transaction에서 갱신)
+    __tablename__ = "T_BEST"
+
+    USERNAME = Column(VARCHAR, primary_key=True)
+    TITLE = Column(VARCHAR, primary_key=True)
+    DIFFICULTY = Column(VARCHAR, primary_key=True)
+    RESULT = Column(VARCHAR)
+    SCORE = Column(VARCHAR)
+    SCORE_NUM = Column(INTEGER)
+    SCORE_DETAIL = Column(VARCHAR)
+    # 최고 점수를 처음 기록한 시간
+    DT = Column(DATETIME)
+    PLAY_COUNT = Column(INTEGER)
+
+    __table_args__ = (
+        Index("IX_T_BEST_USERNAME_SCORE_NUM_DT", "USERNAME", "SCORE_NUM", "DT"),
+        Index("IX_T_BEST_TITLE_DIFFICULTY_SCORE_NUM", "TITLE", "DIFFICULTY", "SCORE_NUM"),
+    )
+
 
 class RecordItem(BaseModel):
      TITLE: str
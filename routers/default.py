@@ -1,16 +1,33 @@
+import asyncio
+import json
 import os
+import re
 import uuid
 import crud.default as crud
-from database import get_db, get_song_title
+import metrics
+from catalog import CATALOG
+from database import get_db
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from models.song import RecordItem
 from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from yolov8.ocr import OCR_BATCHER, OCR_CACHE, OCR_CLIENT
+from yolov8.ocr_client import OCRError
+from yolov8.predict import MODEL_REGISTRY
+from crud.singleflight import KeyConflict
+from yolov8.video import VIDEO_SAMPLE_FPS
+from yolov8.worker import DetectPoolError
+from yolov8.recognizer import LOCAL_OCR
 # Create routing method
 router = APIRouter()
 load_dotenv()
-UPLOAD_DIR_PATH = os.environ.get("UPLOAD_DIR_PATH")
+UPLOAD_BATCH_CONCURRENCY = int(os.environ.get("UPLOAD_BATCH_CONCURRENCY", 4))
+UPLOAD_BATCH_MAX_FILES = int(os.environ.get("UPLOAD_BATCH_MAX_FILES", 100))
+RECORD_PAGE_SIZE = int(os.environ.get("RECORD_PAGE_SIZE", 100))
+RECORD_PAGE_MAX_SIZE = int(os.environ.get("RECORD_PAGE_MAX_SIZE", 1000))
+RECORD_BULK_MAX_SIZE = int(os.environ.get("RECORD_BULK_MAX_SIZE", 1000))
 
 
 @router.get("/")
@@ -18,53 +35,196 @@ def read_root():
     return {"Hello": "World"}
 
 @router.get("/{title}/info")
-def read_song_information(title: str, db:Session = Depends(get_db)):
+def read_song_information(title: str):
     try:
-        result = crud.get_song_information(title, db)
+        result = crud.get_song_information(title)
         # print(result)
         return {"success": True, "data": result}
     except Exception as err:
          raise HTTPException(status_code=500, detail=str(err))
     
 @router.get("/title/all")
-def read_all_song_title():
-     result = get_song_title()
-     print(len(result))
-     return {"succsess": True, "data": result}
+def read_all_song_title(if_none_match: Optional[str] = Header(None)):
+     snapshot = CATALOG.snapshot()
+     headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+     if if_none_match is not None and {snapshot.etag, "*"} & {etag.strip() for etag in if_none_match.split(",")}:
+          return Response(status_code=304, headers=headers)
+     return Response(content=snapshot.title_body, media_type="application/json", headers=headers)
          
 
 @router.get("/{title}/img/{difficulty}")
-def read_song_image(title: str, difficulty: str):
-    title, image_path = crud.get_song_thumbnail(title, difficulty)
-    if not os.path.exists(image_path):
+def read_song_image(title: str, difficulty: str, w: Optional[int] = Query(None, gt=0),
+                    if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None)):
+    entry = crud.get_song_thumbnail(title, difficulty, w)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Not found file")
-    return FileResponse(image_path)
+    if entry.not_modified(if_none_match, if_modified_since):
+        return Response(status_code=304, headers=entry.headers())
+    return FileResponse(entry.path, headers=entry.headers())
 
-@router.post("/upload")
-async def create_image_to_data(file: UploadFile = File(...)):
+@router.get("/model/stats")
+def read_model_stats():
+    data = MODEL_REGISTRY.stats()
+    data["batch"] = crud.PREDICT_BATCHER.stats()
+    data["ocr"] = OCR_CLIENT.stats()
+    data["ocr_batch"] = OCR_BATCHER.stats()
+    data["ocr_cache"] = OCR_CACHE.stats()
+    data["artifact"] = crud.ARTIFACT_WRITER.stats()
+    data["artifact_sweeper"] = crud.ARTIFACT_SWEEPER.stats()
+    data["upload_dedup"] = crud.UPLOAD_DEDUP.stats()
+    data["upload_idempotency"] = crud.UPLOAD_IDEMPOTENCY.stats()
+    if LOCAL_OCR is not None:
+        data["local_ocr"] = LOCAL_OCR.stats()
+    if crud.DETECT_POOL is not None:
+        data["detect_pool"] = crud.DETECT_POOL.stats()
+    return {"success": True, "data": data}
+
+def _request_id(value: Optional[str]) -> str:
+    # 보관 파일 이름으로 쓰므로 안전한 문자로만 된 X-Request-ID만 사용
+    if value and re.fullmatch(r"[A-Za-z0-9_-]{1,64}", value):
+        return value
+    return str(uuid.uuid4())
+
+async def _image_to_data(file: UploadFile, request_id: str, idempotency_key: Optional[str] = None) -> Tuple[List[dict], str]:
     if file.content_type not in ["image/jpeg", "image/png", "image/gif"]:
         raise HTTPException(status_code=400, detail="Invalid file type")
-    image = await file.read()
+    image_bytes = await file.read()
     image_type = file.filename.split(".")[-1]
-    image_name = str(uuid.uuid4())
-    image_path = f"{UPLOAD_DIR_PATH}\\{image_name}.{image_type}"
-    with open(image_path, "wb") as reader:
-        reader.write(image)
-    image, predict = crud.image_predict(image_path)
-    if len(predict) < 5:
-            crud.remove_detect_image(image_name, image_type)
+    if not re.fullmatch(r"[A-Za-z0-9]{1,8}", image_type):
+        image_type = "bin"
+    # 같은 이미지(또는 같은 Idempotency-Key)의 동시 요청은 한 번만 처리하고 최근 결과는 재사용
+    content_key = crud.UPLOAD_DEDUP.key(image_bytes)
+    if idempotency_key:
+        try:
+            # 같은 Idempotency-Key는 같은 이미지일 때만 결과를 돌려줌
+            return await crud.UPLOAD_IDEMPOTENCY.run(idempotency_key, lambda: _process_image(image_bytes, image_type, request_id), content_key)
+        except KeyConflict as err:
+            raise HTTPException(status_code=422, detail=str(err))
+    return await crud.UPLOAD_DEDUP.run(content_key, lambda: _process_image(image_bytes, image_type, request_id))
+
+async def _process_image(image_bytes: bytes, image_type: str, request_id: str) -> List[dict]:
+    # 보관 파일은 요청 id 앞에 서버에서 만든 uuid를 붙여 이름을 붙임 (같은 X-Request-ID로 덮어쓰지 않도록)
+    image_name = crud.artifact_name(request_id)
+    try:
+        predict, ocr_ready, local = await crud.image_predict(image_bytes)
+    except DetectPoolError as err:
+        raise HTTPException(status_code=503, detail=str(err))
+    if len(predict) < crud.MIN_DETECT_COUNT:
+            metrics.DETECT_FAIL.inc()
             raise HTTPException(status_code=400, detail="Not enough detect data")
-    result = await crud.create_image_to_data(image, predict, image_name)
+    crud.archive_upload(image_name, image_type, image_bytes, predict, ocr_ready)
+    try:
+        return await crud.create_image_to_data(ocr_ready, image_name, local)
+    except OCRError as err:
+        raise HTTPException(status_code=502, detail=str(err))
+
+@router.post("/upload")
+async def create_image_to_data(response: Response, file: UploadFile = File(...), x_request_id: Optional[str] = Header(None),
+                               idempotency_key: Optional[str] = Header(None, max_length=255)):
+    request_id = _request_id(x_request_id)
+    response.headers["X-Request-ID"] = request_id
+    result, dedup = await _image_to_data(file, request_id, idempotency_key)
+    # leader: 직접 처리, shared: 동시에 들어온 같은 요청의 결과, recent: 최근 결과 재사용
+    response.headers["X-Dedup"] = dedup
     return {"success": True, "data": result}
 
+@router.post("/upload/batch")
+async def create_images_to_data(files: List[UploadFile] = File(...), x_request_id: Optional[str] = Header(None)):
+    request_id = _request_id(x_request_id)
+    if len(files) > UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {UPLOAD_BATCH_MAX_FILES})")
+    semaphore = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+
+    async def run(index: int, file: UploadFile) -> dict:
+        # 한 장이 실패해도 전체를 실패시키지 않고 결과에 포함
+        item = {"index": index, "filename": file.filename, "request_id": f"{request_id}-{index}", "success": False}
+        async with semaphore:
+            try:
+                item["data"], item["dedup"] = await _image_to_data(file, item["request_id"])
+                item["success"] = True
+            except HTTPException as err:
+                item["detail"] = err.detail
+            except Exception as err:
+                item["detail"] = str(err)
+        return item
+
+    async def stream():
+        # 먼저 끝난 결과부터 한 줄씩(NDJSON) 전송
+        tasks = [asyncio.ensure_future(run(index, file)) for index, file in enumerate(files)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task, ensure_ascii=False) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Request-ID": request_id})
+
+@router.post("/upload/video")
+async def create_video_to_data(file: UploadFile = File(...), x_request_id: Optional[str] = Header(None),
+                               sample_fps: float = Query(VIDEO_SAMPLE_FPS, gt=0, le=30)):
+    request_id = _request_id(x_request_id)
+    if not (file.content_type or "").startswith("video/"):
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    video_type = file.filename.split(".")[-1]
+    if not re.fullmatch(r"[A-Za-z0-9]{1,8}", video_type):
+        video_type = "bin"
+    video_path = await crud.save_video(file, video_type)
+    if video_path is None:
+        raise HTTPException(status_code=413, detail=f"Too large video (max {crud.VIDEO_MAX_BYTES} bytes)")
+
+    async def stream():
+        # 결과 화면을 찾는 대로 한 줄씩(NDJSON) 전송
+        try:
+            async for item in crud.video_to_data(video_path, request_id, sample_fps):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except (ValueError, DetectPoolError) as err:
+            yield json.dumps({"success": False, "detail": str(err)}) + "\n"
+        finally:
+            os.remove(video_path)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Request-ID": request_id})
+
 @router.post("/record")
-async def create_record(data: RecordItem, db: Session=Depends(get_db)):
+def create_record(data: RecordItem, db: Session=Depends(get_db)):
      crud.create_record(data, db)
      return {"success": True}
 
-@router.get("/record/{user_name}")
-async def get_record(user_name: str, db: Session=Depends(get_db)):
-     result = crud.get_record(user_name, db)
+@router.post("/record/bulk")
+def create_records(data: List[RecordItem], db: Session=Depends(get_db)):
+     if len(data) > RECORD_BULK_MAX_SIZE:
+          raise HTTPException(status_code=400, detail=f"Too many records (max {RECORD_BULK_MAX_SIZE})")
+     count = crud.create_records(data, db)
+     return {"success": True, "data": {"count": count}}
+
+@router.get("/best/{user_name}")
+def get_best(user_name: str, limit: int = Query(RECORD_PAGE_SIZE, gt=0, le=RECORD_PAGE_MAX_SIZE),
+             cursor: Optional[str] = None, difficulty: Optional[str] = None, title: Optional[str] = None,
+             db: Session=Depends(get_db)):
+     try:
+          result, next_cursor = crud.get_best(user_name, db, limit, cursor, difficulty, title)
+     except ValueError as err:
+          raise HTTPException(status_code=400, detail=str(err))
+     if len(result) == 0 and cursor is None:
+          raise HTTPException(status_code=404, detail="No data")
+     return {"success": True, "data": result, "next_cursor": next_cursor}
+
+@router.get("/ranking/{title}/{difficulty}")
+def get_ranking(title: str, difficulty: str, limit: int = Query(RECORD_PAGE_SIZE, gt=0, le=RECORD_PAGE_MAX_SIZE),
+                db: Session=Depends(get_db)):
+     result = crud.get_ranking(title, difficulty, db, limit)
      if len(result) == 0:
           raise HTTPException(status_code=404, detail="No data")
-     return {"success": True, "data": result}
\ No newline at end of file
+     return {"success": True, "data": result}
+
+@router.get("/record/{user_name}")
+def get_record(user_name: str, limit: int = Query(RECORD_PAGE_SIZE, gt=0, le=RECORD_PAGE_MAX_SIZE),
+                     cursor: Optional[str] = None, difficulty: Optional[str] = None, title: Optional[str] = None,
+                     db: Session=Depends(get_db)):
+     try:
+          result, next_cursor = crud.get_record(user_name, db, limit, cursor, difficulty, title)
+     except ValueError as err:
+          raise HTTPException(status_code=400, detail=str(err))
+     if len(result) == 0 and cursor is None:
+          raise HTTPException(status_code=404, detail="No data")
+     return {"success": True, "data": result, "next_cursor": next_cursor}
\ No newline at end of file
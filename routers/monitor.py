@@ -0,0 +1,29 @@
+import crud.default as crud
+import metrics
+from catalog import CATALOG
+from fastapi import APIRouter, Response
+from yolov8.ocr import OCR_BATCHER, OCR_CACHE, OCR_CLIENT
+from yolov8.predict import MODEL_REGISTRY
+from yolov8.recognizer import LOCAL_OCR
+# Create routing method
+router = APIRouter()
+metrics.REGISTRY.collector("sdvx_model", MODEL_REGISTRY.stats)
+metrics.REGISTRY.collector("sdvx_predict_batch", crud.PREDICT_BATCHER.stats)
+metrics.REGISTRY.collector("sdvx_ocr", OCR_CLIENT.stats)
+metrics.REGISTRY.collector("sdvx_ocr_batch", OCR_BATCHER.stats)
+metrics.REGISTRY.collector("sdvx_ocr_cache", OCR_CACHE.stats)
+metrics.REGISTRY.collector("sdvx_artifact", crud.ARTIFACT_WRITER.stats)
+metrics.REGISTRY.collector("sdvx_artifact_sweeper", crud.ARTIFACT_SWEEPER.stats)
+metrics.REGISTRY.collector("sdvx_upload_dedup", crud.UPLOAD_DEDUP.stats)
+metrics.REGISTRY.collector("sdvx_upload_idempotency", crud.UPLOAD_IDEMPOTENCY.stats)
+metrics.REGISTRY.collector("sdvx_catalog", CATALOG.stats)
+metrics.REGISTRY.collector("sdvx_title_matcher", lambda: CATALOG.snapshot().matcher.stats())
+if LOCAL_OCR is not None:
+    metrics.REGISTRY.collector("sdvx_local_ocr", LOCAL_OCR.stats)
+if crud.DETECT_POOL is not None:
+    metrics.REGISTRY.collector("sdvx_detect_pool", crud.DETECT_POOL.stats)
+
+
+@router.get("/metrics")
+def read_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,111 @@
+import asyncio
+import metrics
+import os
+from dotenv import load_dotenv
+from typing import Any, List, Optional, Tuple
+from yolov8.predict import Predict, predict_batch
+load_dotenv()
+PREDICT_MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", 8))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", 10))
+
+class PredictBatcher:
+    """
+    동시에 들어온 업로드 이미지를 모아 Yolov8 예측을 한 번에 수행하는 Class
+    최대 max_batch장 또는 max_wait_ms 동안 모은 이미지를 한 번의 forward로 예측하고
+    각 요청에게 자신의 Predict를 돌려줌
+    """
+    def __init__(self, model_path: str, max_batch: int = PREDICT_MAX_BATCH, max_wait_ms: float = PREDICT_MAX_WAIT_MS) -> None:
+        self.model_path = model_path
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batch_count: int = 0
+        self.image_count: int = 0
+
+    def _ensure_started(self) -> None:
+        # event loop 안에서 처음 호출될 때 scheduler 시작
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, source: Any) -> Predict:
+        """이미지를 batch에 넣고 예측 결과를 기다리는 함수
+
+        Args:
+            source (Any): 이미지
+
+        Returns:
+            Predict: 감지된 객체
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        # batch 대기 시간을 포함한 예측 시간
+        with metrics.stage("predict"):
+            await self._queue.put((source, future))
+            return await future
+
+    async def predict_many(self, sources: List[Any]) -> List[Predict]:
+        """여러 이미지를 batch에 넣고 예측 결과를 기다리는 함수 (동영상 frame 등, 단계 시간은 기록하지 않음)
+
+        Args:
+            sources (List[Any]): 이미지 List
+
+        Returns:
+            List[Predict]: 이미지 순서대로 감지된 객체 List
+        """
+        self._ensure_started()
+        futures = []
+        for source in sources:
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((source, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        """첫 이미지가 들어오면 max_batch장 또는 max_wait 동안 이미지를 모으는 함수
+
+        Returns:
+            List[Tuple[Any, asyncio.Future]]: (이미지, 결과 Future) List
+        """
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            sources = [source for source, _ in batch]
+            try:
+                # 추론은 thread에서 수행하여 event loop를 막지 않음
+                results = await asyncio.to_thread(predict_batch, self.model_path, sources)
+            except Exception as err:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+            self.batch_count += 1
+            self.image_count += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        """batch 통계 반환 함수
+
+        Returns:
+            dict: batch 횟수, 이미지 수, 평균 batch 크기
+        """
+        return {
+            "batch": self.batch_count,
+            "image": self.image_count,
+            "avg_batch_size": self.image_count / self.batch_count if self.batch_count else 0.0,
+        }
@@ -1,13 +1,33 @@
 import os
+import metrics
+import numpy as np
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
-from typing import Tuple
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from yolov8.predict import Box
+from yolov8.predict import DETECT_IMGSZ, Box, Predict
+from yolov8.recognizer import recognize
 load_dotenv()
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
+RED = (255, 0, 0)
 FONT_DIR_PATH = os.environ.get("FONT_DIR_PATH")
 TITLE_HEIGHT = 40
+TITLE_WIDTH_BUCKET = 64
+# 감지용 이미지의 짧은 변 최소 크기 (jpeg은 DCT 축소 decode), 0이면 원본 해상도로 감지
+DETECT_DECODE_SIZE = int(os.environ.get("DETECT_DECODE_SIZE", DETECT_IMGSZ))
+
+@lru_cache(maxsize=1)
+def _font() -> ImageFont.FreeTypeFont:
+    """title 글꼴을 한 번만 불러오는 함수
+
+    Returns:
+        ImageFont.FreeTypeFont: title 글꼴
+    """
+    if FONT_DIR_PATH is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(FONT_DIR_PATH, 20)
 
 def _new_title(title: str, size: Tuple[int, int]) -> Image:
     """잘라낸 사진을 구분짓기위한 title 생성 함수
@@ -21,10 +41,29 @@ def _new_title(title: str, size: Tuple[int, int]) -> Image:
     """
     image = Image.new('RGB', (size[0], TITLE_HEIGHT), BLACK)
     draw = ImageDraw.Draw(image)
-    font = ImageFont.truetype(FONT_DIR_PATH, 20)
-    draw.text((10, 0), title, font=font, fill=WHITE)
+    draw.text((10, 0), title, font=_font(), fill=WHITE)
     return image
 
+@lru_cache(maxsize=256)
+def _title_banner(title: str, bucket_width: int) -> np.ndarray:
+    """title을 width bucket 크기로 미리 그려두는 함수
+    bucket보다 좁은 title은 왼쪽부터 잘라 쓰면 같은 그림이 됨
+
+    Args:
+        title (str): 제목
+        bucket_width (int): TITLE_WIDTH_BUCKET 단위로 올림한 너비
+
+    Returns:
+        np.ndarray: 제목 이미지 (읽기 전용)
+    """
+    banner = np.asarray(_new_title(title, (bucket_width, TITLE_HEIGHT)))
+    banner.flags.writeable = False
+    return banner
+
+def _title(title: str, width: int) -> np.ndarray:
+    bucket_width = -(-width // TITLE_WIDTH_BUCKET) * TITLE_WIDTH_BUCKET
+    return _title_banner(title, bucket_width)[:, :width]
+
 def calc_size(cutted_img: dict[str: Image]) -> Tuple[int, int]:
     """OCR 이미지 사이즈 계산 함수
 
@@ -34,14 +73,26 @@ def calc_size(cutted_img: dict[str: Image]) -> Tuple[int, int]:
     Returns:
         Tuple[int, int]: 계산한 이미지 사이즈
     """
+    return _layout(tuple(image.size for image in cutted_img.values()))[0]
+
+def _layout(sizes: Tuple[Tuple[int, int], ...]) -> Tuple[Tuple[int, int], List[int]]:
+    """OCR 이미지 크기와 잘라낸 사진별 시작 높이 계산 함수
+
+    Args:
+        sizes (Tuple[Tuple[int, int], ...]): 잘라낸 사진 크기들
+
+    Returns:
+        Tuple[Tuple[int, int], List[int]]: OCR 이미지 크기, 사진별 title 시작 높이
+    """
     max_width = -1
     max_height = 0
-    for _, image in cutted_img.items():
-        width, height = image.size
+    offsets: List[int] = []
+    for width, height in sizes:
         if max_width < width:
             max_width = width
+        offsets.append(max_height)
         max_height += height + TITLE_HEIGHT # 자른사진 높이 + TITLE 높이
-    return max_width, max_height
+    return (max_width, max_height), offsets
 
 def merge(cutted_img: dict[str: Image], size: Tuple[int, int]) -> Image:
     """OCR 이미지 생성 함수
@@ -53,34 +104,222 @@ def merge(cutted_img: dict[str: Image], size: Tuple[int, int]) -> Image:
     Returns:
         Image: OCR 이미지
     """
-    # for img in cutted_img:
-    current_height: int = 0
-    murge_image = Image.new('RGB', size, BLACK)
-    for title, image in cutted_img.items():
-        title_image = _new_title(title, size)
-        murge_image.paste(title_image, (0, current_height))
-        murge_image.paste(image, (0, current_height + TITLE_HEIGHT))
-        current_height += image.size[1] + TITLE_HEIGHT
-    return murge_image
+    # 미리 할당한 buffer에 title과 사진을 한 번에 채움
+    width, height = size
+    _, offsets = _layout(tuple(image.size for image in cutted_img.values()))
+    murge_image = np.zeros((height, width, 3), dtype=np.uint8)
+    for (title, image), current_height in zip(cutted_img.items(), offsets):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        murge_image[current_height:current_height + TITLE_HEIGHT] = _title(title, width)
+        image_width, image_height = image.size
+        top = current_height + TITLE_HEIGHT
+        murge_image[top:top + image_height, :image_width] = np.asarray(image)
+    return Image.fromarray(murge_image)
+
+def open_image(image_bytes: bytes) -> Image:
+    """업로드된 이미지를 원본 해상도로 decode하고 방향을 맞추는 함수
+    보관용 감지 결과 이미지 등 요청 밖에서만 쓰므로 요청 단계 시간은 기록하지 않음 (요청은 SourceImage 사용)
+
+    Args:
+        image_bytes (bytes): 업로드된 이미지
+
+    Returns:
+        Image: 원본 이미지
+    """
+    img = Image.open(BytesIO(image_bytes))
+    img.load()
+    # 이미지가 가로 > 세로면 오른쪽 90도로 꺽였다고 판단
+    width, height = img.size
+    if width > height:
+        img = img.transpose(Image.Transpose.ROTATE_270)
+    return img
+
+class SourceImage:
+    """
+    업로드 이미지 Class
+    감지는 축소 decode한 이미지로 하고, 원본 해상도는 잘라낼 때 한 번만 decode
+    회전은 전체 화면 대신 감지용 이미지와 잘라낸 사진에만 적용하며 좌표는 회전한 원본 해상도 기준
+    동영상 frame처럼 이미 decode된 RGB 배열도 받음
+    """
+    def __init__(self, image_bytes: bytes|np.ndarray, decode_size: int = DETECT_DECODE_SIZE) -> None:
+        self._source = image_bytes
+        self._full: Optional[Image.Image] = None
+        with metrics.stage("decode"):
+            img = self._open()
+            width, height = img.size
+            if decode_size > 0 and img.format == "JPEG":
+                # 짧은 변이 decode_size 이상인 가장 작은 1/2, 1/4, 1/8 크기로 decode
+                img.draft("RGB", (decode_size, decode_size))
+            img.load()
+            if img.size == (width, height):
+                # 축소 decode가 안 되면 원본을 그대로 잘라낼 때 사용
+                self._full = img
+                scale = min(width, height) // decode_size if decode_size > 0 else 1
+                if scale > 1:
+                    img = img.reduce(scale)
+        # 이미지가 가로 > 세로면 오른쪽 90도로 꺽였다고 판단
+        self.rotated: bool = width > height
+        self.original_size: Tuple[int, int] = (width, height)
+        self.size: Tuple[int, int] = (height, width) if self.rotated else (width, height)
+        if self.rotated:
+            with metrics.stage("rotate"):
+                img = img.transpose(Image.Transpose.ROTATE_270)
+        self.detect_img: Image = img
+
+    def to_full(self, result: Predict) -> Predict:
+        """감지용 이미지 좌표의 감지 결과를 원본 해상도 좌표로 바꾸는 함수
+
+        Args:
+            result (Predict): 감지용 이미지의 예측 결과
+
+        Returns:
+            Predict: 원본 해상도 좌표의 예측 결과
+        """
+        width, height = self.size
+        scale_x = width / self.detect_img.size[0]
+        scale_y = height / self.detect_img.size[1]
+        boxes = list(result.objects.values())
+        if result.scoreboard is not None:
+            boxes.append(result.scoreboard)
+        for box in boxes:
+            x1, y1, x2, y2 = box.pos
+            box.pos = (max(0.0, x1 * scale_x), max(0.0, y1 * scale_y), min(width, x2 * scale_x), min(height, y2 * scale_y))
+        return result
+
+    def crop(self, pos: Tuple[float, float, float, float]) -> Image:
+        """회전한 원본 해상도 좌표의 영역을 잘라내는 함수 (Image.crop과 같은 사용법)
+
+        Args:
+            pos (Tuple[float, float, float, float]): 잘라낼 좌표 (x1, y1, x2, y2)
+
+        Returns:
+            Image: 잘라낸 사진
+        """
+        if self._full is None:
+            with metrics.stage("decode_full"):
+                self._full = self._open()
+                self._full.load()
+        if not self.rotated:
+            return self._full.crop(pos)
+        # 회전한 좌표 (x, y)는 원본의 (y, 높이 - x)
+        x1, y1, x2, y2 = pos
+        height = self.original_size[1]
+        return self._full.crop((y1, height - x2, y2, height - x1)).transpose(Image.Transpose.ROTATE_270)
+
+    def _open(self) -> Image.Image:
+        if isinstance(self._source, np.ndarray):
+            return Image.fromarray(self._source)
+        return Image.open(BytesIO(self._source))
+
+    def release(self) -> None:
+        # 잘라내기가 끝나면 원본 해상도 이미지를 놓음 (필요하면 다시 decode)
+        self._full = None
 
 def cut(original_img: Image, box: Box) -> Image:
     """Yolov8에서 감지한 물체를 원본 이미지에서 잘라내는 함수
 
     Args:
-        original_img (Image): 원본 이미지
+        original_img (Image|SourceImage): 원본 이미지
         box (Box): Yolov8에서 감지한 객체 Box좌표
 
     Returns:
         Image: 감지한 이미지
     """
+    pos = box.pos
     if box.class_nm == "title":
-        xx, xy, yx, yy = box.pos
+        # box 좌표는 보관용 감지 이미지에서도 쓰므로 바꾸지 않음
+        xx, xy, yx, yy = pos
         new_yy = (xy + yy) // 2
-        box.pos = (xx, xy, yx, new_yy)
-    cutting_img = original_img.crop(box.pos)
+        pos = (xx, xy, yx, new_yy)
+    cutting_img = original_img.crop(pos)
     # cutting_img.show()
     return cutting_img
 
+def cut_all(original_img: Image, result: Predict) -> Dict[str, Image]:
+    """감지한 객체를 모두 잘라내는 함수
+
+    Args:
+        original_img (Image|SourceImage): 원본 이미지
+        result (Predict): Yolov8 예측 결과
+
+    Returns:
+        Dict[str, Image]: class 이름 -> 잘라낸 사진
+    """
+    with metrics.stage("cut"):
+        cutted_img = {}
+        for _, box in result.objects.items():
+            cutted_img[box.class_nm] = cut(original_img, box)
+    if isinstance(original_img, SourceImage):
+        original_img.release()
+    return cutted_img
+
+def compose(original_img: Image, result: Predict) -> bytes:
+    """감지한 객체를 잘라 이어붙힌 OCR 이미지를 jpeg로 만드는 함수
+
+    Args:
+        original_img (Image|SourceImage): 원본 이미지
+        result (Predict): Yolov8 예측 결과
+
+    Returns:
+        bytes: OCR 이미지 jpeg
+    """
+    return encode(cut_all(original_img, result))
+
+def compose_local(original_img: Image, result: Predict) -> Tuple[bytes, Dict[str, Any], Dict[str, str]]:
+    """숫자 항목은 로컬 OCR로 읽고, 나머지만 이어붙혀 원격 OCR 이미지를 만드는 함수
+    로컬 OCR 신뢰도가 낮은 항목은 원격 OCR 이미지에 포함
+    항목별 로컬 OCR 결과는 호출한 쪽에서 metrics.observe_local_ocr로 기록
+
+    Args:
+        original_img (Image|SourceImage): 원본 이미지
+        result (Predict): Yolov8 예측 결과
+
+    Returns:
+        Tuple[bytes, Dict[str, Any], Dict[str, str]]: 원격 OCR 이미지 jpeg, 로컬 OCR 결과, 항목별 로컬 OCR 결과
+    """
+    cutted_img = cut_all(original_img, result)
+    with metrics.stage("local_ocr"):
+        local, outcomes = recognize(cutted_img)
+    return encode({class_nm: img for class_nm, img in cutted_img.items() if class_nm not in local}), local, outcomes
+
+def encode(cutted_img: Dict[str, Image]) -> bytes:
+    """잘라낸 사진들을 이어붙혀 jpeg로 만드는 함수
+
+    Args:
+        cutted_img (Dict[str, Image]): 잘라낸 사진들
+
+    Returns:
+        bytes: OCR 이미지 jpeg
+    """
+    # 정보 이어붙히기
+    with metrics.stage("merge"):
+        ocr_ready_image_size = calc_size(cutted_img)
+        ocr_ready_image = merge(cutted_img, ocr_ready_image_size)
+    with metrics.stage("encode"):
+        ocr_ready_byte_image = BytesIO()
+        ocr_ready_image.save(ocr_ready_byte_image, "jpeg")
+    return ocr_ready_byte_image.getvalue()
+
+def annotate(original_img: Image, result: Predict) -> bytes:
+    """감지 결과를 원본 이미지에 그려 jpeg로 만드는 함수 (보관용)
+
+    Args:
+        original_img (Image): 원본 이미지
+        result (Predict): Yolov8 예측 결과
+
+    Returns:
+        bytes: 감지 결과 jpeg
+    """
+    annotated_img = original_img.convert('RGB')
+    draw = ImageDraw.Draw(annotated_img)
+    for class_nm, box in result.objects.items():
+        draw.rectangle(box.pos, outline=RED, width=3)
+        draw.text((box.pos[0], max(box.pos[1] - 12, 0)), f"{class_nm} {box.conf:.2f}", fill=RED)
+    annotated_byte_img = BytesIO()
+    annotated_img.save(annotated_byte_img, "jpeg")
+    return annotated_byte_img.getvalue()
+
 # for file in os.listdir("./sdvx/"):
 #     cut_image(f"./sdvx/{file}")
 # new_title("TITLE", (850, 1888))
\ No newline at end of file
@@ -0,0 +1,121 @@
+import difflib
+import os
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+from threading import Lock
+from typing import List, Optional, Tuple
+load_dotenv()
+MATCHER_CACHE_SIZE = int(os.environ.get("MATCHER_CACHE_SIZE", 1024))
+
+class SequenceIndex:
+    """
+    sequence_matcher와 같은 결과를 내는 색인된 유사 단어 검색 Class
+    원본 단어 List의 byte 빈도표를 미리 만들어두고, 유사도 상한(quick_ratio)으로 후보를 추려
+    상한이 높은 후보부터 실제 유사도를 계산함. 최근 OCR 결과는 LRU cache에 보관
+    """
+    def __init__(self, template: List[str], cache_size: int = MATCHER_CACHE_SIZE) -> None:
+        self.template: List[str] = list(template)
+        self._bytes: List[List[int]] = [list(bytes(temp, 'utf-8')) for temp in self.template]
+        self._length = np.array([len(temp) for temp in self._bytes], dtype=np.int64)
+        # 단어별 byte 빈도표 (len(template) x 256)
+        self._count = np.zeros((len(self._bytes), 256), dtype=np.int32)
+        for idx, temp in enumerate(self._bytes):
+            np.add.at(self._count[idx], temp, 1)
+        self._cache: OrderedDict[Tuple[str, Optional[float]], Tuple[Optional[str], float]] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = Lock()
+        self.hit: int = 0
+        self.miss: int = 0
+
+    def __len__(self) -> int:
+        return len(self.template)
+
+    def _bound(self, input_bytes_list: List[int]) -> np.ndarray:
+        """단어별 유사도 상한 계산 함수 (difflib quick_ratio와 동일)
+
+        Args:
+            input_bytes_list (List[int]): OCR 결과 단어 byte List
+
+        Returns:
+            np.ndarray: 단어별 유사도 상한
+        """
+        input_count = np.bincount(np.array(input_bytes_list, dtype=np.int64), minlength=256) if input_bytes_list else np.zeros(256, dtype=np.int64)
+        matches = np.minimum(self._count, input_count).sum(axis=1)
+        length = self._length + len(input_bytes_list)
+        # 두 단어가 모두 빈 문자열이면 difflib은 1.0을 반환
+        return np.where(length > 0, 2.0 * matches / np.maximum(length, 1), 1.0)
+
+    def _match(self, target: str, target_conf: Optional[float]) -> Tuple[Optional[str], float]:
+        input_bytes_list = list(bytes(target, 'utf-8'))
+        bound = self._bound(input_bytes_list)
+        # 상한 내림차순, 같은 상한이면 원본 순서대로
+        order = np.lexsort((np.arange(len(bound)), -bound))
+        sm = difflib.SequenceMatcher(None)
+        # b(OCR 결과)의 분석 결과를 재사용
+        sm.set_seq2(input_bytes_list)
+        best_ratio = -1
+        best_idx = -1
+        for idx in order.tolist():
+            upper = float(bound[idx])
+            if upper < best_ratio or (target_conf is not None and upper < target_conf):
+                # 남은 후보는 모두 상한이 더 작음
+                break
+            if upper == best_ratio and idx > best_idx:
+                # 유사도가 같으면 sequence_matcher는 앞선 단어를 선택
+                continue
+            sm.set_seq1(self._bytes[idx])
+            similar = sm.ratio()
+            if target_conf is not None and target_conf > similar:
+                continue
+            if best_ratio < similar or (best_ratio == similar and idx < best_idx):
+                best_ratio = similar
+                best_idx = idx
+        if best_idx < 0:
+            return None, 0.0
+        return self.template[best_idx], best_ratio
+
+    def match(self, target: str, target_conf: Optional[float] = None) -> Optional[str]:
+        """OCR 결과와 가장 유사한 단어 검색 함수 (sequence_matcher와 동일한 결과)
+
+        Args:
+            target (str): OCR 결과 단어
+            target_conf (Optional[float], optional): 목표 유사도. Defaults to None.
+
+        Returns:
+            Optional[str]: OCR 결과와 가장 유사한 단어
+        """
+        return self.match_ratio(target, target_conf)[0]
+
+    def match_ratio(self, target: str, target_conf: Optional[float] = None) -> Tuple[Optional[str], float]:
+        """OCR 결과와 가장 유사한 단어와 그 유사도 검색 함수
+
+        Args:
+            target (str): OCR 결과 단어
+            target_conf (Optional[float], optional): 목표 유사도. Defaults to None.
+
+        Returns:
+            Tuple[Optional[str], float]: OCR 결과와 가장 유사한 단어, 유사도
+        """
+        key = (target, target_conf)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hit += 1
+                return self._cache[key]
+            self.miss += 1
+        result = self._match(target, target_conf)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        """cache 통계 반환 함수
+
+        Returns:
+            dict: 단어 수, cache 크기, hit/miss 횟수
+        """
+        with self._lock:
+            return {"template": len(self.template), "cache": len(self._cache), "hit": self.hit, "miss": self.miss}
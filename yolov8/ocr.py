@@ -1,25 +1,34 @@
+import asyncio
 import base64
-import database
 import difflib
-import json
+import metrics
 import os
 import re
-import requests
-import uuid
 from dotenv import load_dotenv
 from io import BytesIO
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+from catalog import CATALOG
+from yolov8.ocr_batch import OCRBatcher
+from yolov8.ocr_cache import OCRCache
+from yolov8.matcher import SequenceIndex
+from yolov8.ocr_client import OCRClient
 load_dotenv()
-CLASS_JOB: Dict[str, bool] = {"difficulty": False, "result": False,"score": False, "detail": False, "rate": False, "title": False}
 CLASS_LIST: List[str] = ["difficulty", "result", "score", "detail","rate", "title"]
 DETAIL_LIST: List[str] = ["ERROR", "NEAR", "CRITICAL", "S_CRITICAL"]
 DIFFICULTY_LIST: List[str] = ["NOV", "ADV", "EXH", "MXM", "INF", "GRV", "HVN", "VVD", "XCD"]
 RESULT_LIST: List[str] = ["CRASH", "COMPLETE", "PERFECT", "ULTIMATECHAIN"]
 RATE_LIST: List[str] = ["EFFECTIVE RATE", "EXCESSIVE RATE"]
-SONG_LIST: List[str] = database.get_song_title()
 JSON_DIR_PATH = os.environ.get("JSON_DIR_PATH")
-OCR_API_URL = os.environ.get("OCR_API_URL")
-OCR_TOKEN = os.environ.get("OCR_TOKEN")
+OCR_CLIENT = OCRClient()
+OCR_CACHE = OCRCache(JSON_DIR_PATH)
+# label과 고정 단어 matcher는 한 번만 만들어 모든 요청이 공유
+LABEL_MATCHER = SequenceIndex(CLASS_LIST)
+DETAIL_MATCHER = SequenceIndex(DETAIL_LIST)
+DIFFICULTY_MATCHER = SequenceIndex(DIFFICULTY_LIST)
+RESULT_MATCHER = SequenceIndex(RESULT_LIST)
+RATE_MATCHER = SequenceIndex(RATE_LIST)
+# 동시에 들어온 업로드의 OCR 이미지를 한 번에 요청 (OCR_CLIENT는 요청 시점에 찾음)
+OCR_BATCHER = OCRBatcher(lambda data: OCR_CLIENT.request(data))
 
 def sequence_matcher(target: str, template: List[str], target_conf: Optional[float]=None) -> str:
     """OCR 처리 후, 원본 단어와 가장 유사한 단어를 계산하는 함수 (https://shorturl.at/lvT17)
@@ -62,17 +71,19 @@ def post_process(current_job: str, ocr_value: list|str, dup_switch: bool) -> lis
         list|str: 보정된 OCR 결과 값
     """
     if current_job == "title":
-            ocr_value = sequence_matcher(ocr_value, SONG_LIST)
+            ocr_value, ratio = CATALOG.snapshot().matcher.match_ratio(ocr_value)
+            metrics.TITLE_MATCH_RATIO.observe(ratio)
     elif current_job == "score":
         # 숫자만 남게
         ocr_value = re.sub(r'[^0-9]', '', ocr_value)
         if list(ocr_value)[0] == "0":
             # 0XXXXXX -> XXXXXX로 보정
             ocr_value = ocr_value[1:]
+            metrics.OCR_FIELD_FALLBACK.inc("score")
     elif current_job == "difficulty":
         # 문자만 남게
         ocr_value = re.sub(r'\d', '', ocr_value).strip()
-        ocr_value = sequence_matcher(ocr_value, DIFFICULTY_LIST)
+        ocr_value = DIFFICULTY_MATCHER.match(ocr_value)
     elif current_job == "rate":
         ocr_value = ocr_value.split()
         ocr_value[-1] = re.sub(r'[^\d, ., %]', '', ocr_value[-1])
@@ -83,119 +94,159 @@ def post_process(current_job: str, ocr_value: list|str, dup_switch: bool) -> lis
             # print(ocr_value[idx])
             if ocr_value[idx] in ["O", "o"]:
                 ocr_value[idx] = "0"
+                metrics.OCR_FIELD_FALLBACK.inc("detail")
             elif ocr_value[idx] in ["I", "i"]:
                 ocr_value[idx] = "1"
+                metrics.OCR_FIELD_FALLBACK.inc("detail")
             elif not ocr_value[idx].isdigit():
                 ocr_value[idx] = "-1"
+                metrics.OCR_FIELD_FALLBACK.inc("detail")
         if dup_switch is True:
             ocr_value.append("-1")
+            metrics.OCR_FIELD_FALLBACK.inc("detail")
     elif current_job == "result":
-        ocr_value = sequence_matcher(ocr_value, RESULT_LIST)
+        ocr_value = RESULT_MATCHER.match(ocr_value)
     return ocr_value
 
-def req_OCR_data(image: BytesIO, image_name: str) -> List[dict]:
+async def req_OCR_data(image: BytesIO, image_name: str, local: Optional[Dict[str, Any]] = None) -> List[dict]:
     """OCR 요청 함수
 
     Args:
         image (BytesIO): OCR 이미지
         image_name (str): OCR 이미지 이름 (uuid)
+        local (Optional[Dict[str, Any]], optional): 로컬 OCR 결과 (OCR 이미지에서 빠진 항목). Defaults to None.
 
     Returns:
         List[dict]: OCR 결과 List
     """
-    # OCR 한글 요청하기
-    url = OCR_API_URL
-    header = {
-        "Content-Type": "application/json",
-        "X-OCR-SECRET": OCR_TOKEN
-        }
-    data = {
-        "version": "V2",
-        "requestId": str(uuid.uuid4()),
-        "lang": "ja",
-        "timestamp": 0,
-        "images": [{"format": "jpg", "name": "result", "data": base64.b64encode(image.getvalue()).decode('utf-8')}]
-    }
-    res = requests.post(url=url, headers=header, data=json.dumps(data))
-    result = json.loads(res.text.encode('utf8'))
-    with open(f"{JSON_DIR_PATH}\\{image_name}.json", 'w', encoding='utf-8') as file:
-        json.dump(result, file)
-    current_job = None
-    dup_switch: bool =  False
-    ocr_result_list: List[dict] = []
-    ocr_result = {}
-    ocr_value: list|str|None
-    for image in result['images']:
-        for field in image["fields"]:
-            value = field["inferText"]
-            title = sequence_matcher(value, CLASS_LIST, 0.9)
-            job_list = list(CLASS_JOB.values())
-            if (title is not None and True in job_list) or len(set(job_list)) == 1:
-                # job_list 모두 false이거나, title이 들어왔는데 job_list에 True가 있을 때
-                # current_job을 교체하여 다음에 수행할 작업을 변경함
-                if current_job is None:
-                    current_job = title
-                    CLASS_JOB[title] = True
-                else:
-                    # print(current_job, ocr_value)
-                    CLASS_JOB[current_job] = False
-                    CLASS_JOB[title] = True
-                    ocr_value = post_process(current_job, ocr_value, dup_switch)
-                    ocr_result[current_job] = ocr_value
-                    current_job = title
-                    
-                if current_job == "detail":
-                    # "score_detail"
-                    # 리스트로 초기화
-                    ocr_value = []
-                else:
-                    # "result", "result_perfect", "UC", "score", "score_perfect", "score_rate", "title", "difficulty"
-                    # 문자열로 초기화
-                    ocr_value = ""
-                continue
-            # 데이터 정제하기
-            # print(current_job, ocr_value)
-            if current_job == "result":
-                # SUCCESS, CRASH, PERFECT, ULTIMATE CHAIN
-                ocr_value += sequence_matcher(value, RESULT_LIST)
-            elif current_job == "detail":
-                # ERROR, NEAR, CRITICAL, S-CRITICAL
-                result = sequence_matcher(value, DETAIL_LIST, 0.35)
-                if result is None:
-                    ocr_value.append(value)
-                    dup_switch = False
-                elif result is not None and dup_switch is True:
-                    ocr_value.append("-1")
-                else:
-                    dup_switch = True
-            elif current_job == "score":
-                # 0 ~ 100000
-                # print(f"currentjob: {result}")
-                ocr_value += value
-            elif current_job == "rate":
-                # EFFECTIVE RATE, EXCESSIVE RATE
-                result = sequence_matcher(value, RATE_LIST, 0.45)
-                # print(f"scorerate: {result}")
-                if result is None:
-                    ocr_value += value 
-                else:
-                    ocr_value += result + " "
-            elif current_job == "title":
-                # song title
-                ocr_value += value
-            elif current_job == "difficulty":
-                # difficulty
-                ocr_value += value + " "
-        ocr_value = post_process(current_job, ocr_value, dup_switch)
-        ocr_result[current_job] = ocr_value
-        ocr_result_list.append(ocr_result)
-        # 변수 초기화
-        current_job = None
-        dup_switch = False
-        ocr_result = {}
-        ocr_value = None
+    # 같은 OCR 이미지는 저장된 응답 재사용 (cache 파일 읽기/쓰기는 event loop 밖에서 수행)
+    cache_key = OCR_CACHE.key(image.getvalue())
+    result = await asyncio.to_thread(OCR_CACHE.get, cache_key)
+    if result is not None:
+        with metrics.stage("ocr_parse"):
+            return _with_local(parse_OCR_data(result), local)
+    # OCR 요청하기 (다른 업로드와 묶어서 요청, batcher가 자기 결과만 찾아 돌려줌)
+    data = {"format": "jpg", "name": image_name, "data": base64.b64encode(image.getvalue()).decode('utf-8')}
+    with metrics.stage("ocr_http"):
+        result = await OCR_BATCHER.request(data)
+    await asyncio.to_thread(OCR_CACHE.put, cache_key, result)
+    with metrics.stage("ocr_parse"):
+        return _with_local(parse_OCR_data(result), local)
+
+def _with_local(ocr_result_list: List[dict], local: Optional[Dict[str, Any]]) -> List[dict]:
+    # 로컬 OCR로 읽은 항목을 원격 OCR 결과에 합침
+    if local:
+        for ocr_result in ocr_result_list:
+            ocr_result.update(local)
     return ocr_result_list
 
+def parse_OCR_data(result: dict) -> List[dict]:
+    """OCR 결과 분석 함수
+
+    Args:
+        result (dict): OCR API 응답
+
+    Returns:
+        List[dict]: OCR 결과 List
+    """
+    return OCRParser().parse(result)
+
+
+class OCRParser:
+    """
+    OCR API 응답 분석 Class
+    OCR 단어를 순서대로 읽으며 label(difficulty, score 등)이 나오면 작업을 바꾸고,
+    다음 label이 나올 때까지의 단어를 현재 작업의 값으로 모아 post_process로 보정
+    분석 상태는 객체 안에만 보관하므로 요청마다 새로 만들면 여러 thread/task에서 동시에 사용 가능
+    """
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self.current_job: Optional[str] = None
+        # score_detail label 중복 입력 확인 변수
+        self.dup_switch: bool = False
+        self.ocr_result: dict = {}
+        self.ocr_value: list|str|None = None
+
+    def _flush(self) -> None:
+        # 현재 작업의 값을 보정하여 결과에 저장
+        with metrics.stage("post_process"):
+            self.ocr_result[self.current_job] = post_process(self.current_job, self.ocr_value, self.dup_switch)
+
+    def feed(self, value: str) -> None:
+        """OCR 단어 하나를 읽는 함수
+
+        Args:
+            value (str): OCR 단어 (inferText)
+        """
+        label = LABEL_MATCHER.match(value, 0.9)
+        if label is not None:
+            # label이 들어오면 현재 작업을 마치고 다음에 수행할 작업을 변경함
+            if self.current_job is not None:
+                self._flush()
+            self.current_job = label
+            # "score_detail"은 리스트, 나머지는 문자열로 초기화
+            self.ocr_value = [] if label == "detail" else ""
+            return
+        # 데이터 정제하기
+        current_job = self.current_job
+        if current_job == "result":
+            # SUCCESS, CRASH, PERFECT, ULTIMATE CHAIN
+            self.ocr_value += RESULT_MATCHER.match(value)
+        elif current_job == "detail":
+            # ERROR, NEAR, CRITICAL, S-CRITICAL
+            if DETAIL_MATCHER.match(value, 0.35) is None:
+                self.ocr_value.append(value)
+                self.dup_switch = False
+            elif self.dup_switch is True:
+                self.ocr_value.append("-1")
+            else:
+                self.dup_switch = True
+        elif current_job == "score":
+            # 0 ~ 100000
+            self.ocr_value += value
+        elif current_job == "rate":
+            # EFFECTIVE RATE, EXCESSIVE RATE
+            rate = RATE_MATCHER.match(value, 0.45)
+            if rate is None:
+                self.ocr_value += value
+            else:
+                self.ocr_value += rate + " "
+        elif current_job == "title":
+            # song title
+            self.ocr_value += value
+        elif current_job == "difficulty":
+            # difficulty
+            self.ocr_value += value + " "
+
+    def finish(self) -> dict:
+        """이미지 하나의 분석을 마치고 결과를 반환하는 함수
+
+        Returns:
+            dict: 항목별 OCR 결과
+        """
+        self._flush()
+        ocr_result = self.ocr_result
+        self._reset()
+        return ocr_result
+
+    def parse(self, result: dict) -> List[dict]:
+        """OCR API 응답 분석 함수 (이미지별 결과)
+
+        Args:
+            result (dict): OCR API 응답
+
+        Returns:
+            List[dict]: OCR 결과 List
+        """
+        ocr_result_list: List[dict] = []
+        for image in result['images']:
+            for field in image["fields"]:
+                self.feed(field["inferText"])
+            ocr_result_list.append(self.finish())
+        return ocr_result_list
+
                 
 # print(sequence_matcher("ERMFAL", DETAIL_LIST))
 # print(req_OCR())
\ No newline at end of file
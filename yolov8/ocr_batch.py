@@ -0,0 +1,117 @@
+import asyncio
+import os
+import uuid
+from dotenv import load_dotenv
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+from yolov8.ocr_client import OCRError
+load_dotenv()
+OCR_MAX_BATCH = int(os.environ.get("OCR_MAX_BATCH", 4))
+OCR_MAX_WAIT_MS = float(os.environ.get("OCR_MAX_WAIT_MS", 20))
+
+class OCRBatcher:
+    """
+    여러 업로드의 OCR 이미지를 모아 한 번의 OCR API 요청(images List)으로 보내는 Class
+    최대 max_batch장 또는 max_wait_ms 동안 모은 이미지를 보내고,
+    이미지마다 batch 안에서만 쓰는 내부 이름을 붙여 보내고, 응답의 이미지별 결과를 내부 이름으로 나누어 각 업로드에게 돌려줌
+    (요청한 이름은 client가 정할 수 있는 요청 id라 겹칠 수 있으므로 결과를 찾는 데 쓰지 않음)
+    모은 batch는 바로 보내고 다음 batch를 모으므로 여러 batch가 동시에 요청될 수 있음
+    """
+    def __init__(self, send: Callable[[dict], Awaitable[dict]], max_batch: int = OCR_MAX_BATCH, max_wait_ms: float = OCR_MAX_WAIT_MS) -> None:
+        self._send_request = send
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Set[asyncio.Task] = set()
+        self.batch_count: int = 0
+        self.image_count: int = 0
+
+    def _ensure_started(self) -> None:
+        # event loop 안에서 처음 호출될 때 scheduler 시작
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def request(self, image: dict) -> dict:
+        """OCR 이미지를 batch에 넣고 자신의 결과만 담긴 OCR 응답을 기다리는 함수
+
+        Args:
+            image (dict): OCR 요청 이미지 ({"format", "name", "data"})
+
+        Raises:
+            OCRError: OCR API 요청이 실패했거나 응답에 이미지 결과가 없는 경우
+
+        Returns:
+            dict: OCR 응답 (images에는 요청한 이미지 결과 하나만 포함)
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[dict, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # 응답을 기다리는 동안 다음 batch를 모음 (동시 요청 수는 OCRClient에서 제한)
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        names = [uuid.uuid4().hex for _ in batch]
+        data = {
+            "version": "V2",
+            "requestId": str(uuid.uuid4()),
+            "lang": "ja",
+            "timestamp": 0,
+            "images": [dict(image, name=name) for (image, _), name in zip(batch, names)],
+        }
+        try:
+            result = await self._send_request(data)
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        self.batch_count += 1
+        self.image_count += len(batch)
+        images = result.get("images", [])
+        by_name = {image.get("name"): image for image in images}
+        for idx, ((image, future), name) in enumerate(zip(batch, names)):
+            if future.done():
+                continue
+            # 응답 순서가 바뀌어도 내부 이름으로 찾고, 응답에 이름이 없으면 요청 순서로 찾음
+            found = by_name.get(name)
+            if found is None and idx < len(images) and images[idx].get("name") is None:
+                found = images[idx]
+            if found is None:
+                future.set_exception(OCRError(f"OCR API returned no result for {image.get('name')}"))
+            else:
+                # 요청한 이름으로 되돌려 반환
+                future.set_result(dict(result, images=[dict(found, name=image.get("name"))]))
+
+    def stats(self) -> dict:
+        """batch 통계 반환 함수
+
+        Returns:
+            dict: batch 횟수, 이미지 수, 평균 batch 크기, 요청중인 batch 수
+        """
+        return {
+            "batch": self.batch_count,
+            "image": self.image_count,
+            "avg_batch_size": self.image_count / self.batch_count if self.batch_count else 0.0,
+            "sending": len(self._sending),
+        }
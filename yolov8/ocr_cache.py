@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Optional, Tuple
+load_dotenv()
+JSON_DIR_PATH = os.environ.get("JSON_DIR_PATH")
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", 10000))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+OCR_CACHE_TTL = float(os.environ.get("OCR_CACHE_TTL", 7 * 24 * 60 * 60))
+
+class OCRCache:
+    """
+    OCR 이미지 내용(sha256)을 key로 OCR API 응답을 저장하는 disk cache Class
+    응답 원본 JSON을 JSON_DIR_PATH에 {key}.json으로 저장하고
+    항목 수/전체 크기 제한(LRU)과 TTL로 오래된 항목을 삭제
+    파일 읽기/쓰기는 lock 밖에서 수행하고 lock은 항목 정보 갱신에만 사용 (event loop에서는 asyncio.to_thread로 호출)
+    """
+    def __init__(self, dir_path: Optional[str] = JSON_DIR_PATH, max_entries: int = OCR_CACHE_MAX_ENTRIES,
+                 max_bytes: int = OCR_CACHE_MAX_BYTES, ttl: float = OCR_CACHE_TTL) -> None:
+        self.dir_path = dir_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (파일 크기, 마지막 사용 시간), 오래 사용하지 않은 순서
+        self._entries: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self._bytes: int = 0
+        self.hit: int = 0
+        self.miss: int = 0
+        self.eviction: int = 0
+        self._load_index()
+
+    @staticmethod
+    def key(image: bytes) -> str:
+        """OCR 이미지 byte로 cache key 생성 함수
+
+        Args:
+            image (bytes): OCR 이미지 (jpeg)
+
+        Returns:
+            str: sha256 hex
+        """
+        return hashlib.sha256(image).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir_path, f"{key}.json")
+
+    def _load_index(self) -> None:
+        # 서버 재시작 후에도 기존 cache 파일을 LRU 순서(mtime)대로 등록
+        if self.dir_path is None or not os.path.isdir(self.dir_path):
+            return
+        entries = []
+        for entry in os.scandir(self.dir_path):
+            name, ext = os.path.splitext(entry.name)
+            if ext != ".json" or len(name) != 64:
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self._entries[name] = (size, mtime)
+            self._bytes += size
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self.eviction += 1
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        expire = time.time() - self.ttl
+        while self._entries:
+            key, (_, used) = next(iter(self._entries.items()))
+            if used >= expire and len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            self._remove(key)
+
+    def get(self, key: str) -> Optional[dict]:
+        """cache된 OCR 응답 검색 함수
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            Optional[dict]: OCR API 응답, 없거나 만료된 경우 None
+        """
+        if self.dir_path is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.time() - self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.miss += 1
+                return None
+        try:
+            with open(self._path(key), encoding='utf-8') as file:
+                result = json.load(file)
+        except (OSError, ValueError):
+            with self._lock:
+                # 읽는 사이 put으로 새로 저장된 경우는 지우지 않음
+                if self._entries.get(key) == entry:
+                    self._remove(key)
+                self.miss += 1
+            return None
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], now)
+                self._entries.move_to_end(key)
+            self.hit += 1
+        try:
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """OCR 응답 저장 함수
+
+        Args:
+            key (str): cache key
+            result (dict): OCR API 응답
+        """
+        if self.dir_path is None:
+            return
+        # 임시 파일에 쓴 뒤 교체하여 동시에 읽는 get이 쓰는 중인 파일을 보지 않게 함
+        temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(result, file)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0]
+            self._entries[key] = (size, time.time())
+            self._bytes += size
+            self._evict()
+
+    def stats(self) -> dict:
+        """cache 통계 반환 함수
+
+        Returns:
+            dict: 항목 수, 전체 크기, hit/miss/eviction 횟수
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hit": self.hit, "miss": self.miss, "eviction": self.eviction}
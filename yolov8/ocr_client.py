@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import random
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from typing import Optional
+load_dotenv()
+OCR_API_URL = os.environ.get("OCR_API_URL")
+OCR_TOKEN = os.environ.get("OCR_TOKEN")
+OCR_MAX_CONCURRENCY = int(os.environ.get("OCR_MAX_CONCURRENCY", 8))
+OCR_TIMEOUT = float(os.environ.get("OCR_TIMEOUT", 10))
+OCR_RETRIES = int(os.environ.get("OCR_RETRIES", 2))
+OCR_BACKOFF = float(os.environ.get("OCR_BACKOFF", 0.2))
+
+class OCRError(Exception):
+    """OCR API 요청이 재시도 후에도 실패했을 때 발생하는 예외"""
+
+
+class OCRClient:
+    """
+    OCR API 요청 Class
+    keep-alive connection pool을 유지하고, 동시 요청 수 제한, 요청별 timeout,
+    5xx/timeout 발생시 jitter가 섞인 지수 backoff로 재시도
+    요청은 thread에서 수행되어 event loop를 막지 않음
+    """
+    def __init__(self, url: Optional[str] = OCR_API_URL, token: Optional[str] = OCR_TOKEN,
+                 max_concurrency: int = OCR_MAX_CONCURRENCY, timeout: float = OCR_TIMEOUT,
+                 retries: int = OCR_RETRIES, backoff: float = OCR_BACKOFF) -> None:
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = requests.Session()
+        # 동시 요청 수만큼 connection을 재사용 (재시도는 직접 처리)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.in_flight: int = 0
+        self.retry_count: int = 0
+        self.error_count: int = 0
+
+    def _post(self, body: str) -> requests.Response:
+        header = {
+            "Content-Type": "application/json",
+            "X-OCR-SECRET": self.token
+            }
+        return self._session.post(url=self.url, headers=header, data=body, timeout=self.timeout)
+
+    def _sleep_time(self, attempt: int) -> float:
+        # full jitter: 0 ~ backoff * 2^attempt
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    async def request(self, data: dict) -> dict:
+        """OCR API 요청 함수
+
+        Args:
+            data (dict): OCR 요청 데이터
+
+        Raises:
+            OCRError: 재시도 후에도 5xx, timeout, 연결 오류가 발생한 경우
+
+        Returns:
+            dict: OCR 결과
+        """
+        body = json.dumps(data)
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        res = await asyncio.to_thread(self._post, body)
+                    except (requests.Timeout, requests.ConnectionError) as err:
+                        reason = f"{type(err).__name__}: {err}"
+                    else:
+                        if res.status_code < 400:
+                            return json.loads(res.text.encode('utf8'))
+                        elif res.status_code < 500:
+                            # 요청 자체가 잘못된 경우 재시도하지 않음
+                            self.error_count += 1
+                            raise OCRError(f"OCR API status {res.status_code}")
+                        reason = f"OCR API status {res.status_code}"
+                    if attempt < self.retries:
+                        self.retry_count += 1
+                        await asyncio.sleep(self._sleep_time(attempt))
+                self.error_count += 1
+                raise OCRError(reason)
+            finally:
+                self.in_flight -= 1
+
+    def close(self) -> None:
+        self._session.close()
+
+    def stats(self) -> dict:
+        """OCR 요청 통계 반환 함수
+
+        Returns:
+            dict: 진행중인 요청 수, 재시도 횟수, 실패 횟수
+        """
+        return {"in_flight": self.in_flight, "retry": self.retry_count, "error": self.error_count}
@@ -1,5 +1,22 @@
-from typing import Any, Dict, List, Tuple
-from ultralytics import YOLO
+import ast
+import os
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+from typing import Any, Dict, List, Optional, Tuple
+load_dotenv()
+MODEL_CHECK_INTERVAL = float(os.environ.get("MODEL_CHECK_INTERVAL", 5))
+WARMUP_SIZE = int(os.environ.get("WARMUP_SIZE", 640))
+# 추론 입력 크기와 CPU thread 수 (0이면 runtime 기본값)
+DETECT_IMGSZ = int(os.environ.get("DETECT_IMGSZ", 640))
+DETECT_THREADS = int(os.environ.get("DETECT_THREADS", 0))
+DETECT_CONF = 0.65
+DETECT_IOU = 0.7
+MAX_DET = 300
+# class별 NMS를 한 번에 하기 위한 class별 좌표 offset
+MAX_WH = 7680
 
 class Box:
     """
@@ -53,6 +70,10 @@ class Predict:
     """
     def __init__(self) -> None:
         self.objects:Dict[str: Box] = {}
+        # 결과 화면 전체 영역 (OCR 대상이 아니므로 objects와 따로 저장)
+        self.scoreboard: Optional[Box] = None
+        # 이미 불러온 model로 예측했는지 여부 (crud.image_predict에서 metrics.MODEL_HIT로 기록)
+        self.model_hit: bool = False
 
     def __str__(self) -> str:
         return f"Object Length: {len(self.objects)}"
@@ -65,6 +86,8 @@ class Predict:
     
     def add(self, box: Box):
         if box.class_nm == "scoreboard":
+            if self.scoreboard is None or self.scoreboard.conf < box.conf:
+                self.scoreboard = box
             return
         if box.class_nm not in self.objects:
             self.objects[box.class_nm] = box
@@ -75,7 +98,337 @@ class Predict:
     
 
 
-def predict(model_path: str, source: Any) -> List[Predict]:
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """NMS (torchvision.ops.nms와 같은 결과)
+
+    Args:
+        boxes (np.ndarray): xyxy 좌표 (N x 4)
+        scores (np.ndarray): 신뢰도 (N)
+        iou_threshold (float): 이 값보다 많이 겹치는 box는 제거
+
+    Returns:
+        np.ndarray: 남은 box index (신뢰도 내림차순)
+    """
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort(kind="stable")[::-1]
+    keep: List[int] = []
+    while order.size > 0:
+        idx = order[0]
+        keep.append(int(idx))
+        rest = order[1:]
+        width = np.clip(np.minimum(x2[idx], x2[rest]) - np.maximum(x1[idx], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[idx], y2[rest]) - np.maximum(y1[idx], y1[rest]), 0, None)
+        inter = width * height
+        iou = inter / (areas[idx] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """
+    export한 Yolov8 ONNX model을 CPU runtime(onnxruntime)으로 실행하는 Class
+    torch 없이 letterbox 전처리, box 변환, NMS를 numpy로 수행하여 ultralytics와 같은 감지 결과를 반환
+    """
+    def __init__(self, model_path: str, imgsz: int = DETECT_IMGSZ, threads: int = DETECT_THREADS) -> None:
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        # 고정 크기로 export한 model은 export한 크기를 사용
+        self.imgsz: Tuple[int, int] = (height, width) if isinstance(height, int) and isinstance(width, int) else (imgsz, imgsz)
+        self.dynamic_batch = not isinstance(batch, int)
+        # ultralytics export시 저장된 class 이름 ("{0: 'title', ...}")
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def _letterbox(self, source: Image) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+        """비율을 유지하며 입력 크기로 줄이고 남는 부분을 회색으로 채우는 함수 (ultralytics LetterBox)
+
+        Args:
+            source (Image): 이미지
+
+        Returns:
+            Tuple[np.ndarray, float, Tuple[int, int]]: CHW 이미지, 축소 비율, (왼쪽, 위) 여백
+        """
+        if source.mode != 'RGB':
+            source = source.convert('RGB')
+        height, width = self.imgsz
+        gain = min(height / source.height, width / source.width)
+        new_width, new_height = round(source.width * gain), round(source.height * gain)
+        left, top = round((width - new_width) / 2 - 0.1), round((height - new_height) / 2 - 0.1)
+        canvas = np.full((height, width, 3), 114, dtype=np.uint8)
+        canvas[top:top + new_height, left:left + new_width] = np.asarray(source.resize((new_width, new_height), Image.BILINEAR))
+        return canvas.transpose(2, 0, 1), gain, (left, top)
+
+    def _decode(self, output: np.ndarray, gain: float, pad: Tuple[int, int], size: Tuple[int, int],
+                conf: float, iou: float) -> List[Tuple[str, List[float], float]]:
+        """model 출력 (4 + class 수, 후보 수)을 원본 이미지 좌표의 감지 결과로 바꾸는 함수"""
+        prediction = output.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confs = scores[np.arange(len(scores)), class_ids]
+        mask = confs > conf
+        prediction, class_ids, confs = prediction[mask], class_ids[mask], confs[mask]
+        if len(prediction) == 0:
+            return []
+        # cx, cy, w, h -> x1, y1, x2, y2
+        boxes = np.empty((len(prediction), 4), dtype=np.float32)
+        boxes[:, :2] = prediction[:, :2] - prediction[:, 2:4] / 2
+        boxes[:, 2:] = prediction[:, :2] + prediction[:, 2:4] / 2
+        keep = _nms(boxes + class_ids[:, None] * MAX_WH, confs, iou)[:MAX_DET]
+        boxes, class_ids, confs = boxes[keep], class_ids[keep], confs[keep]
+        boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, size[0])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, size[1])
+        return [(self.names.get(int(class_id), str(int(class_id))), box.tolist(), float(box_conf))
+                for class_id, box, box_conf in zip(class_ids, boxes, confs)]
+
+    def detect(self, sources: List[Image], conf: float = DETECT_CONF, iou: float = DETECT_IOU) -> List[List[Tuple[str, List[float], float]]]:
+        """여러 이미지 감지 함수
+
+        Args:
+            sources (List[Image]): 이미지 List
+            conf (float, optional): 최소 신뢰도. Defaults to DETECT_CONF.
+            iou (float, optional): NMS IoU 기준. Defaults to DETECT_IOU.
+
+        Returns:
+            List[List[Tuple[str, List[float], float]]]: 이미지별 (class 이름, xyxy 좌표, 신뢰도) List
+        """
+        inputs = [self._letterbox(source) for source in sources]
+        batch = np.stack([chw for chw, _, _ in inputs]).astype(np.float32) / 255.0
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            # batch 1로 export한 model은 한 장씩 실행
+            outputs = np.concatenate([self.session.run(None, {self.input_name: batch[idx:idx + 1]})[0] for idx in range(len(batch))])
+        return [self._decode(output, gain, pad, source.size, conf, iou)
+                for output, (_, gain, pad), source in zip(outputs, inputs, sources)]
+
+
+class ModelRegistry:
+    """
+    Yolov8 model을 프로세스(worker) 단위로 보관하는 Class
+    model을 한 번만 불러와 warmup 후 재사용하고, 가중치 파일이 바뀌면 재시작 없이 교체
+    model 경로별 lock으로 불러오기는 한 번만 수행하고, 동시에 model이 필요한 요청은 불러오기가 끝날 때까지 기다림
+    """
+    def __init__(self, check_interval: float = MODEL_CHECK_INTERVAL) -> None:
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._models: Dict[str, Any] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._checked: Dict[str, float] = {}
+        self._check_interval = check_interval
+        self.hit: int = 0
+        self.miss: int = 0
+        self.swap_count: int = 0
+
+    def _load(self, model_path: str) -> Any:
+        """model을 불러와 dummy 이미지로 warmup 하는 함수
+
+        Args:
+            model_path (str): Yolov8 model 저장 위치
+
+        Returns:
+            Any: warmup이 끝난 model
+        """
+        warmup = Image.new('RGB', (WARMUP_SIZE, WARMUP_SIZE))
+        if model_path.endswith(".onnx"):
+            model = OnnxDetector(model_path)
+            model.detect([warmup])
+            return model
+        # ONNX model만 쓰는 worker는 torch를 불러오지 않도록 필요할 때 import
+        from ultralytics import YOLO
+        if DETECT_THREADS > 0:
+            import torch
+            torch.set_num_threads(DETECT_THREADS)
+        model = YOLO(model_path)
+        # 첫 추론시 발생하는 predictor 생성, graph 준비 비용을 미리 지불
+        model.predict(warmup, imgsz=DETECT_IMGSZ, verbose=False)
+        return model
+
+    def _load_lock(self, model_path: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(model_path, threading.Lock())
+
+    def _mtime(self, model_path: str) -> float:
+        try:
+            return os.path.getmtime(model_path)
+        except OSError:
+            return 0.0
+
+    def load(self, model_path: str) -> Any:
+        """model을 (다시) 불러와 등록하는 함수, 서버 시작시 warmup 용도로 사용
+
+        Args:
+            model_path (str): Yolov8 model 저장 위치
+
+        Returns:
+            Any: 등록된 model
+        """
+        with self._load_lock(model_path):
+            return self._register(model_path)
+
+    def _register(self, model_path: str) -> Any:
+        # model_path의 load lock을 잡은 상태에서 호출
+        mtime = self._mtime(model_path)
+        # 불러오는 동안에도 기존 model로 요청을 처리할 수 있도록 registry lock 밖에서 불러옴
+        model = self._load(model_path)
+        with self._lock:
+            if model_path in self._models:
+                self.swap_count += 1
+            self._models[model_path] = model
+            self._mtimes[model_path] = mtime
+            self._checked[model_path] = time.monotonic()
+        return model
+
+    def swap(self, model_path: str, new_model_path: str) -> Any:
+        """model_path로 등록된 model을 새 가중치 파일로 교체하는 함수
+
+        Args:
+            model_path (str): 교체할 model의 등록 이름 (YOLO_MODEL_PATH)
+            new_model_path (str): 새 가중치 파일 위치
+
+        Returns:
+            Any: 교체된 model
+        """
+        with self._load_lock(model_path):
+            model = self._load(new_model_path)
+            with self._lock:
+                self._models[model_path] = model
+                self._mtimes[model_path] = self._mtime(model_path)
+                self._checked[model_path] = time.monotonic()
+                self.swap_count += 1
+        return model
+
+    def get(self, model_path: str) -> Tuple[Any, bool]:
+        """등록된 model을 가져오는 함수, 없으면 불러오고 가중치 파일이 바뀌었으면 교체
+
+        Args:
+            model_path (str): Yolov8 model 저장 위치
+
+        Returns:
+            Tuple[Any, bool]: model, 이미 불러온 model 사용 여부
+        """
+        model = self._models.get(model_path)
+        if model is None:
+            # 먼저 온 요청이 불러오는 중이면 끝날 때까지 기다린 뒤 그 model 사용
+            with self._load_lock(model_path):
+                model = self._models.get(model_path)
+                if model is None:
+                    with self._lock:
+                        self.miss += 1
+                    return self._register(model_path), False
+        else:
+            now = time.monotonic()
+            with self._lock:
+                # 확인 주기마다 한 요청만 가중치 파일을 확인
+                due = now - self._checked.get(model_path, 0.0) >= self._check_interval
+                if due:
+                    self._checked[model_path] = now
+            if due and self._mtime(model_path) != self._mtimes.get(model_path):
+                # 가중치 파일이 교체됨 -> 새 model로 hot-swap (다른 요청은 교체 전까지 기존 model 사용)
+                with self._load_lock(model_path):
+                    if self._mtime(model_path) != self._mtimes.get(model_path):
+                        with self._lock:
+                            self.miss += 1
+                        return self._register(model_path), False
+                    model = self._models[model_path]
+        with self._lock:
+            self.hit += 1
+        return model, True
+
+    def stats(self) -> Dict[str, Any]:
+        """model 재사용 통계 반환 함수
+        이 프로세스의 registry 기준이며 hit/miss는 get 호출(감지 batch) 단위
+        (요청 단위 값과 worker 프로세스 감지는 metrics.MODEL_HIT로 기록)
+
+        Returns:
+            Dict[str, Any]: 불러온 model 목록, hit/miss/swap 횟수
+        """
+        with self._lock:
+            return {
+                "models": list(self._models.keys()),
+                "hit": self.hit,
+                "miss": self.miss,
+                "swap": self.swap_count,
+            }
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def _to_predict(result: Any, model_hit: bool) -> Predict:
+    """Yolov8 결과 하나를 Predict로 변환하는 함수
+
+    Args:
+        result (Any): Yolov8 예측 결과 (이미지 1장)
+        model_hit (bool): 이미 불러온 model 사용 여부
+
+    Returns:
+        Predict: 감지된 객체
+    """
+    detections = []
+    # print(result.names)
+    for box in result.boxes:
+        class_id = result.names[box.cls[0].item()]
+        cords = box.xyxy[0].tolist()
+        conf = box.conf[0].item()
+        # print("Object type:", class_id)
+        # print("Coordinates:", cords)
+        # print("Probability:", conf)
+        detections.append((class_id, cords, conf))
+    return _build_predict(detections, model_hit)
+
+
+def _build_predict(detections: List[Tuple[str, List[float], float]], model_hit: bool) -> Predict:
+    """(class 이름, xyxy 좌표, 신뢰도) List를 Predict로 변환하는 함수
+
+    Args:
+        detections (List[Tuple[str, List[float], float]]): 감지 결과
+        model_hit (bool): 이미 불러온 model 사용 여부
+
+    Returns:
+        Predict: 감지된 객체
+    """
+    predict = Predict()
+    predict.model_hit = model_hit
+    for class_id, cords, conf in detections:
+        box = Box()
+        box.class_nm = class_id
+        box.pos = cords
+        box.conf = conf
+        predict.add(box)
+    return predict
+
+
+def predict_batch(model_path: str, sources: List[Any]) -> List[Predict]:
+    """Yolov8 여러 이미지 한 번에 예측 (forward 1회)
+
+    Args:
+        model_path (str): Yolov8 model 저장 위치
+        sources (List[Any]): 이미지 List
+
+    Returns:
+        List[Predict]: 이미지 순서대로 감지된 객체 List
+    """
+    # 프로세스에 이미 불러온 model 재사용
+    model, model_hit = MODEL_REGISTRY.get(model_path)
+    if isinstance(model, OnnxDetector):
+        return [_build_predict(detections, model_hit) for detections in model.detect(sources)]
+    # 감지 결과 이미지는 요청 처리 후 background에서 저장 (crud.archive_upload)
+    results = model.predict(sources, conf=DETECT_CONF, imgsz=DETECT_IMGSZ, verbose=False)
+    return [_to_predict(result, model_hit) for result in results]
+
+
+def predict(model_path: str, source: Any) -> Predict:
     """Yolov8 이미지 예측
 
     Args:
@@ -83,27 +436,6 @@ def predict(model_path: str, source: Any) -> List[Predict]:
         source (Any): 이미지
 
     Returns:
-        List[Predict]: 감지된 객체 리스트
+        Predict: 감지된 객체
     """
-    # Load a pretrained YOLOv8n model
-    model = YOLO(model_path)
-    predict = Predict()
-
-    # Run inference on 'bus.jpg' with arguments
-    results = model.predict(source, conf=0.65, save=True, project="images", name="detect", exist_ok=True)
-
-    for result in results:
-        # print(result.names)
-        for box in result.boxes:
-            class_id = result.names[box.cls[0].item()]
-            cords = box.xyxy[0].tolist()
-            conf = box.conf[0].item()
-            # print("Object type:", class_id)
-            # print("Coordinates:", cords)
-            # print("Probability:", conf)
-            box = Box()
-            box.class_nm = class_id
-            box.pos = cords
-            box.conf = conf
-            predict.add(box)
-    return predict
\ No newline at end of file
+    return predict_batch(model_path, [source])[0]
@@ -0,0 +1,374 @@
+import argparse
+import numpy as np
+import os
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from PIL import Image
+from typing import Any, Dict, List, Optional, Tuple
+load_dotenv()
+# 숫자 template 폴더 (없으면 로컬 OCR을 쓰지 않고 모두 원격 OCR로 보냄)
+LOCAL_OCR_TEMPLATE_DIR_PATH = os.environ.get("LOCAL_OCR_TEMPLATE_DIR_PATH")
+LOCAL_OCR_BACKEND = os.environ.get("LOCAL_OCR_BACKEND", "digit")
+LOCAL_OCR_FIELDS: Tuple[str, ...] = tuple(field for field in os.environ.get("LOCAL_OCR_FIELDS", "score,detail,rate").split(",") if field)
+# 이 값보다 신뢰도가 낮으면 원격 OCR로 보냄
+LOCAL_OCR_MIN_CONF = float(os.environ.get("LOCAL_OCR_MIN_CONF", 0.85))
+GLYPH_SIZE: Tuple[int, int] = (16, 24)
+LABEL_SIZE: Tuple[int, int] = (96, 16)
+# 줄 높이 대비 이 값보다 작은 글자는 소수점으로 봄
+SMALL_GLYPH_RATIO = 0.4
+# 줄 높이 대비 이 값보다 넓은 간격은 단어 구분으로 봄
+WORD_GAP_RATIO = 0.6
+DETAIL_ROWS = 4
+RATE_LIST: List[str] = ["EFFECTIVE RATE", "EXCESSIVE RATE"]
+GLYPH_NAMES: Dict[str, str] = {".": "dot", "%": "percent"}
+
+
+def _binarize(image: Image) -> np.ndarray:
+    """글자 부분만 True인 배열로 바꾸는 함수 (Otsu threshold)
+
+    Args:
+        image (Image): 잘라낸 사진
+
+    Returns:
+        np.ndarray: 글자 mask
+    """
+    gray = np.asarray(image.convert('L'), dtype=np.uint8)
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    total = weight[-1]
+    background = total - weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * weight - mean * total) ** 2 / (weight * background)
+    between = np.where(background > 0, between, np.nan)
+    # 한 가지 색만 있는 사진은 threshold를 정할 수 없음
+    threshold = int(np.nanargmax(between)) if not np.isnan(between).all() else 127
+    ink = gray > threshold
+    # 배경보다 글자가 적다고 보고, 밝은 부분이 더 많으면 어두운 글자
+    return ink if ink.mean() <= 0.5 else ~ink
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """True 구간 [start, end) List 반환 함수"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+
+def _tight(mask: np.ndarray) -> np.ndarray:
+    """글자가 있는 부분만 남기는 함수"""
+    rows = _runs(mask.any(axis=1))
+    columns = _runs(mask.any(axis=0))
+    if not rows:
+        return mask
+    return mask[rows[0][0]:rows[-1][1], columns[0][0]:columns[-1][1]]
+
+def _rows(ink: np.ndarray) -> List[np.ndarray]:
+    """글자 mask를 줄 단위로 나누는 함수 (작은 잡음 줄은 버림)"""
+    runs = _runs(ink.any(axis=1))
+    if not runs:
+        return []
+    tallest = max(end - start for start, end in runs)
+    return [ink[start:end] for start, end in runs if end - start >= tallest * 0.3]
+
+def _glyphs(row: np.ndarray) -> List[Tuple[int, int, np.ndarray]]:
+    """한 줄을 글자 단위로 나누는 함수
+
+    Args:
+        row (np.ndarray): 한 줄 글자 mask
+
+    Returns:
+        List[Tuple[int, int, np.ndarray]]: (시작 x, 끝 x, 글자 mask) List
+    """
+    glyphs = []
+    for start, end in _runs(row.any(axis=0)):
+        glyph = row[:, start:end]
+        runs = _runs(glyph.any(axis=1))
+        glyphs.append((start, end, glyph[runs[0][0]:runs[-1][1]]))
+    return glyphs
+
+def _words(row: np.ndarray) -> List[List[Tuple[int, int, np.ndarray]]]:
+    """한 줄을 단어 단위로 나누는 함수"""
+    words: List[List[Tuple[int, int, np.ndarray]]] = []
+    for glyph in _glyphs(row):
+        if words and glyph[0] - words[-1][-1][1] <= row.shape[0] * WORD_GAP_RATIO:
+            words[-1].append(glyph)
+        else:
+            words.append([glyph])
+    return words
+
+def _normalize(mask: np.ndarray, size: Tuple[int, int], keep_aspect: bool = True) -> np.ndarray:
+    """mask를 정해진 크기의 평균 0, 길이 1 vector로 바꾸는 함수
+
+    Args:
+        mask (np.ndarray): 글자 mask
+        size (Tuple[int, int]): (너비, 높이)
+        keep_aspect (bool, optional): 비율을 유지하고 좌우를 채울지 여부. Defaults to True.
+
+    Returns:
+        np.ndarray: 정규화한 vector
+    """
+    if keep_aspect:
+        # "1"처럼 좁은 글자가 늘어나지 않도록 template 비율에 맞게 좌우를 채움
+        height, width = mask.shape
+        canvas_width = max(width, -(-height * size[0] // size[1]))
+        canvas = np.zeros((height, canvas_width), dtype=bool)
+        left = (canvas_width - width) // 2
+        canvas[:, left:left + width] = mask
+        mask = canvas
+    image = Image.fromarray(mask.astype(np.uint8) * 255).resize(size, Image.BILINEAR)
+    vector = np.asarray(image, dtype=np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class OCRBackend(ABC):
+    """
+    로컬 OCR backend 기본 Class
+    fields에 있는 class의 잘라낸 사진을 읽어 post_process를 거친 원격 OCR 결과와 같은 형식의 값과 신뢰도를 반환
+    """
+    name: str = "base"
+
+    def __init__(self, fields: Tuple[str, ...] = LOCAL_OCR_FIELDS) -> None:
+        self.fields = fields
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    @abstractmethod
+    def recognize(self, class_nm: str, image: Image) -> Tuple[Any, float]:
+        """잘라낸 사진 하나를 읽는 함수
+
+        Args:
+            class_nm (str): 감지한 객체 이름
+            image (Image): 잘라낸 사진
+
+        Returns:
+            Tuple[Any, float]: 인식 값, 신뢰도 (0 ~ 1)
+        """
+
+    def stats(self) -> dict:
+        return {"name": self.name, "fields": len(self.fields), "ready": self.ready}
+
+
+class DigitTemplateBackend(OCRBackend):
+    """
+    숫자 template matching backend Class
+    게임의 숫자 글꼴은 고정이므로 글자를 잘라 미리 저장한 template와의 상관계수로 숫자를 읽음
+    template 폴더에는 0.png ~ 9.png, dot.png, percent.png와 rate label(effective_rate.png, excessive_rate.png)을 둠
+    """
+    name = "digit"
+
+    def __init__(self, template_dir: Optional[str] = LOCAL_OCR_TEMPLATE_DIR_PATH, fields: Tuple[str, ...] = LOCAL_OCR_FIELDS) -> None:
+        super().__init__(fields)
+        self.template_dir = template_dir
+        self.chars: List[str] = []
+        self._templates = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        self.labels: List[str] = []
+        self._label_templates = np.zeros((0, LABEL_SIZE[0] * LABEL_SIZE[1]), dtype=np.float32)
+        if template_dir is not None and os.path.isdir(template_dir):
+            self._load(template_dir)
+
+    def _load(self, template_dir: str) -> None:
+        names = {name: char for char, name in GLYPH_NAMES.items()}
+        glyphs: List[np.ndarray] = []
+        labels: List[np.ndarray] = []
+        for file_name in sorted(os.listdir(template_dir)):
+            stem, ext = os.path.splitext(file_name)
+            if ext.lower() != ".png":
+                continue
+            with Image.open(os.path.join(template_dir, file_name)) as template:
+                ink = _tight(_binarize(template))
+            label = stem.upper().replace("_", " ")
+            if label in RATE_LIST:
+                self.labels.append(label)
+                labels.append(_normalize(ink, LABEL_SIZE, keep_aspect=False))
+            elif (stem.isdigit() and len(stem) == 1) or stem in names:
+                self.chars.append(names.get(stem, stem))
+                glyphs.append(_normalize(ink, GLYPH_SIZE))
+        if glyphs:
+            self._templates = np.stack(glyphs)
+        if labels:
+            self._label_templates = np.stack(labels)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.chars) > 0
+
+    def _read(self, glyphs: List[Tuple[int, int, np.ndarray]], row_height: int, allowed: str) -> Tuple[str, float]:
+        """글자 List를 한 번의 행렬곱으로 template와 비교해 읽는 함수
+
+        Args:
+            glyphs (List[Tuple[int, int, np.ndarray]]): 글자 List
+            row_height (int): 줄 높이
+            allowed (str): 허용 문자
+
+        Returns:
+            Tuple[str, float]: 읽은 문자열, 가장 낮은 글자 신뢰도
+        """
+        if not glyphs:
+            return "", 0.0
+        chars: List[Optional[str]] = []
+        vectors: List[np.ndarray] = []
+        for _, _, mask in glyphs:
+            if mask.shape[0] < row_height * SMALL_GLYPH_RATIO:
+                # 소수점은 모양보다 크기로 구분
+                chars.append("." if "." in allowed else None)
+            else:
+                chars.append("")
+                vectors.append(_normalize(mask, GLYPH_SIZE))
+        if None in chars:
+            return "", 0.0
+        conf = 1.0
+        if vectors:
+            allowed_idx = [idx for idx, char in enumerate(self.chars) if char in allowed]
+            if not allowed_idx:
+                return "", 0.0
+            scores = np.stack(vectors) @ self._templates[allowed_idx].T
+            best = scores.argmax(axis=1)
+            conf = float(scores[np.arange(len(best)), best].min())
+            read = iter(self.chars[allowed_idx[idx]] for idx in best.tolist())
+            chars = [char or next(read) for char in chars]
+        return "".join(chars), max(conf, 0.0)
+
+    def _label(self, row: np.ndarray, end: int) -> Tuple[Optional[str], float]:
+        if not self.labels:
+            return None, 0.0
+        label = _tight(row[:, :end])
+        if not label.any():
+            return None, 0.0
+        scores = self._label_templates @ _normalize(label, LABEL_SIZE, keep_aspect=False)
+        best = int(scores.argmax())
+        return self.labels[best], max(float(scores[best]), 0.0)
+
+    def recognize(self, class_nm: str, image: Image) -> Tuple[Any, float]:
+        if not self.ready:
+            return None, 0.0
+        rows = _rows(_binarize(image))
+        if class_nm == "score":
+            if len(rows) != 1:
+                return None, 0.0
+            value, conf = self._read(_glyphs(rows[0]), rows[0].shape[0], "0123456789")
+            if not value:
+                return None, 0.0
+            # 원격 OCR post_process와 같은 보정 (0XXXXXX -> XXXXXX)
+            return (value[1:] if value[0] == "0" else value), conf
+        elif class_nm == "detail":
+            if len(rows) != DETAIL_ROWS:
+                return None, 0.0
+            values: List[str] = []
+            conf = 1.0
+            for row in rows:
+                words = _words(row)
+                # label 오른쪽의 마지막 단어가 개수
+                value, row_conf = self._read(words[-1], row.shape[0], "0123456789")
+                if len(words) < 2 or not value:
+                    return None, 0.0
+                values.append(value)
+                conf = min(conf, row_conf)
+            return values, conf
+        elif class_nm == "rate":
+            if len(rows) != 1:
+                return None, 0.0
+            words = _words(rows[0])
+            if len(words) < 2:
+                return None, 0.0
+            value, conf = self._read(words[-1], rows[0].shape[0], "0123456789.%")
+            label, label_conf = self._label(rows[0], words[-1][0][0])
+            if not value or label is None:
+                return None, 0.0
+            return f"{label} {value}", min(conf, label_conf)
+        return None, 0.0
+
+    def stats(self) -> dict:
+        data = super().stats()
+        data.update({"templates": len(self.chars), "labels": len(self.labels)})
+        return data
+
+
+BACKENDS: Dict[str, type] = {"digit": DigitTemplateBackend}
+
+def load_backend(name: str = LOCAL_OCR_BACKEND) -> Optional[OCRBackend]:
+    """이름으로 로컬 OCR backend를 만드는 함수
+
+    Args:
+        name (str, optional): backend 이름 ("none"이면 사용 안 함). Defaults to LOCAL_OCR_BACKEND.
+
+    Returns:
+        Optional[OCRBackend]: 로컬 OCR backend, 사용할 수 없으면 None
+    """
+    if name not in BACKENDS:
+        return None
+    backend = BACKENDS[name]()
+    return backend if backend.ready else None
+
+LOCAL_OCR: Optional[OCRBackend] = load_backend()
+
+def recognize(cutted_img: Dict[str, Image], backend: Optional[OCRBackend] = None,
+              min_conf: float = LOCAL_OCR_MIN_CONF) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """잘라낸 사진 중 로컬 OCR로 읽을 수 있는 값을 읽는 함수
+    신뢰도가 낮은 값은 빼고 반환하여 원격 OCR로 보냄
+    worker 프로세스에서도 실행되므로 항목별 결과는 반환만 하고 metrics.observe_local_ocr로 부모 프로세스에서 기록
+
+    Args:
+        cutted_img (Dict[str, Image]): Yolov8에서 감지한 사진들
+        backend (Optional[OCRBackend], optional): 로컬 OCR backend. Defaults to LOCAL_OCR.
+        min_conf (float, optional): 최소 신뢰도. Defaults to LOCAL_OCR_MIN_CONF.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, str]]: class 이름 -> 인식 값, class 이름 -> 결과 ("local" 또는 "fallback")
+    """
+    backend = backend or LOCAL_OCR
+    if backend is None:
+        return {}, {}
+    local: Dict[str, Any] = {}
+    outcomes: Dict[str, str] = {}
+    for class_nm in backend.fields:
+        if class_nm not in cutted_img:
+            continue
+        value, conf = backend.recognize(class_nm, cutted_img[class_nm])
+        if value is not None and conf >= min_conf:
+            local[class_nm] = value
+            outcomes[class_nm] = "local"
+        else:
+            outcomes[class_nm] = "fallback"
+    return local, outcomes
+
+def save_templates(image: Image, text: str, template_dir: str) -> List[str]:
+    """정답을 아는 사진에서 글자를 잘라 template로 저장하는 함수
+
+    Args:
+        image (Image): 숫자만 있는 사진 (score 영역 등)
+        text (str): 사진의 문자열 (예: "09876543")
+        template_dir (str): template 폴더
+
+    Raises:
+        ValueError: 잘라낸 글자 수와 문자열 길이가 다른 경우
+
+    Returns:
+        List[str]: 저장한 파일 경로 List
+    """
+    glyphs = [glyph for row in _rows(_binarize(image)) for glyph in _glyphs(row)]
+    text = text.replace(" ", "")
+    if len(glyphs) != len(text):
+        raise ValueError(f"{len(glyphs)} glyphs found for {len(text)} characters")
+    os.makedirs(template_dir, exist_ok=True)
+    paths = []
+    for char, (_, _, mask) in zip(text, glyphs):
+        path = os.path.join(template_dir, f"{GLYPH_NAMES.get(char, char)}.png")
+        Image.fromarray(mask.astype(np.uint8) * 255).save(path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    # python -m yolov8.recognizer <template 폴더> <사진> <문자열>
+    # rate label은 label 부분만 잘라 effective_rate.png, excessive_rate.png로 저장
+    parser = argparse.ArgumentParser()
+    parser.add_argument("template_dir")
+    parser.add_argument("image")
+    parser.add_argument("text")
+    args = parser.parse_args()
+    with Image.open(args.image) as source:
+        for saved in save_templates(source, args.text, args.template_dir):
+            print(saved)
@@ -0,0 +1,266 @@
+import argparse
+import os
+import threading
+import time
+import metrics
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from yolov8.image import DETECT_DECODE_SIZE, SourceImage
+from yolov8.predict import Predict, predict_batch
+load_dotenv()
+# 초당 감지할 frame 수 (나머지 frame은 decode만 하고 건너뜀)
+VIDEO_SAMPLE_FPS = float(os.environ.get("VIDEO_SAMPLE_FPS", 2))
+# 한 번에 감지할 frame 수
+VIDEO_DETECT_BATCH = int(os.environ.get("VIDEO_DETECT_BATCH", 4))
+# 직전 감지 frame과 fingerprint(16x16 bit)가 이 값 이하로 다르면 같은 화면으로 보고 감지 결과 재사용
+VIDEO_SAME_DISTANCE = int(os.environ.get("VIDEO_SAME_DISTANCE", 8))
+# 결과 화면이 이 시간(초) 이상 보이지 않으면 다음 결과로 봄
+VIDEO_RESULT_GAP = float(os.environ.get("VIDEO_RESULT_GAP", 3))
+FINGERPRINT_SIZE = 16
+
+
+def read_video(video_path: str, sample_fps: float = VIDEO_SAMPLE_FPS, stop: Optional[threading.Event] = None) -> Iterator[Tuple[float, np.ndarray]]:
+    """동영상에서 sample_fps 간격으로 frame을 읽는 함수
+
+    Args:
+        video_path (str): 동영상 파일 위치
+        sample_fps (float, optional): 초당 읽을 frame 수. Defaults to VIDEO_SAMPLE_FPS.
+        stop (Optional[threading.Event], optional): 중단 신호. Defaults to None.
+
+    Raises:
+        ValueError: 동영상을 열 수 없는 경우
+
+    Yields:
+        Iterator[Tuple[float, np.ndarray]]: (재생 시간(초), RGB frame)
+    """
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Invalid video")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / sample_fps))
+        index = 0
+        # grab만 하면 색 변환, 복사 없이 다음 frame으로 넘어감
+        while (stop is None or not stop.is_set()) and capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def fingerprint(img: Image) -> np.ndarray:
+    """frame 비교용 average hash (밝기가 평균보다 밝은지 여부)
+
+    Args:
+        img (Image): 감지용 이미지
+
+    Returns:
+        np.ndarray: FINGERPRINT_SIZE x FINGERPRINT_SIZE bool 배열
+    """
+    gray = np.asarray(img.convert("L").resize((FINGERPRINT_SIZE, FINGERPRINT_SIZE), Image.BILINEAR), dtype=np.float32)
+    return gray > gray.mean()
+
+
+class VideoResult:
+    """
+    동영상에서 찾은 결과 화면 Class
+    같은 결과 화면이 이어진 구간과 그중 가장 잘 감지된 frame을 저장
+    """
+    def __init__(self, timestamp: float, image: SourceImage, result: Predict) -> None:
+        self.start: float = timestamp
+        self.end: float = timestamp
+        self.timestamp: float = timestamp
+        self.image: SourceImage = image
+        self.predict: Predict = result
+        self.frames: int = 1
+
+    def score(self) -> Tuple[int, float]:
+        # 감지한 객체 수, 신뢰도 합이 큰 frame을 고름
+        return len(self.predict), sum(box.conf for box in self.predict.objects.values())
+
+    def update(self, timestamp: float, image: SourceImage, result: Predict) -> None:
+        self.end = timestamp
+        self.frames += 1
+        candidate = VideoResult(timestamp, image, result)
+        # 결과 화면은 점수가 올라가는 효과 뒤에 멈추므로 점수가 같으면 나중 frame을 사용
+        if candidate.score() >= self.score():
+            self.timestamp = timestamp
+            self.image = image
+            self.predict = result
+
+
+class FrameBatch:
+    """
+    감지를 기다리는 frame 묶음 Class
+    (재생 시간, 축소 decode한 frame), frame별 fingerprint, 감지할 frame 위치를 저장
+    """
+    def __init__(self, pending: List[Tuple[float, SourceImage]], fingerprints: List[np.ndarray], targets: List[int]) -> None:
+        self.pending = pending
+        self.fingerprints = fingerprints
+        self.targets = targets
+
+
+class VideoScanner:
+    """
+    동영상 frame에서 결과 화면을 찾는 Class
+    frame을 축소하여 묶어서 감지하고, 직전 감지 frame과 같은 화면이면 감지를 건너뜀
+    결과 화면(scoreboard 또는 min_count개 이상 객체)이 이어진 구간마다 가장 좋은 frame 하나만 반환
+    메모리에는 감지 중인 frame 묶음과 구간별 최고 frame 하나만 유지
+    scan은 detect 함수로 감지하고, 서버에서는 batches -> 감지(await) -> apply -> finish 순서로 나누어 호출하여
+    frame decode만 thread에서 수행하고 감지는 event loop에서 기다림
+    """
+    def __init__(self, detect: Optional[Callable[[List[Image.Image]], List[Predict]]], min_count: int, batch: int = VIDEO_DETECT_BATCH,
+                 same_distance: int = VIDEO_SAME_DISTANCE, result_gap: float = VIDEO_RESULT_GAP,
+                 decode_size: int = DETECT_DECODE_SIZE) -> None:
+        self.detect = detect
+        self.min_count = min_count
+        self.batch = max(1, batch)
+        self.same_distance = same_distance
+        self.result_gap = result_gap
+        self.decode_size = decode_size
+        self._reference: Optional[Tuple[np.ndarray, Predict]] = None
+        # batches에서 마지막으로 감지 대상으로 고른 frame (감지 결과를 받기 전에 다음 묶음을 고를 수 있음)
+        self._last_fingerprint: Optional[np.ndarray] = None
+        self._current: Optional[VideoResult] = None
+        self.frames: int = 0
+        self.detected: int = 0
+        self.reused: int = 0
+        self.results: int = 0
+        self.last_timestamp: float = 0.0
+
+    def scan(self, frames: Iterable[Tuple[float, np.ndarray]]) -> Iterator[VideoResult]:
+        """frame에서 결과 화면을 찾는 함수
+
+        Args:
+            frames (Iterable[Tuple[float, np.ndarray]]): (재생 시간(초), RGB frame), read_video 또는 frame stream
+
+        Yields:
+            Iterator[VideoResult]: 찾은 결과 화면 (구간이 끝날 때마다)
+        """
+        for batch in self.batches(frames):
+            images = [batch.pending[idx][1].detect_img for idx in batch.targets]
+            yield from self.apply(batch, self.detect(images) if images else [])
+        found = self.finish()
+        if found is not None:
+            yield found
+
+    def batches(self, frames: Iterable[Tuple[float, np.ndarray]]) -> Iterator[FrameBatch]:
+        """frame을 감지용 크기로 decode하여 batch개씩 묶는 함수 (thread에서 호출)
+
+        Args:
+            frames (Iterable[Tuple[float, np.ndarray]]): (재생 시간(초), RGB frame), read_video 또는 frame stream
+
+        Yields:
+            Iterator[FrameBatch]: frame 묶음과 감지할 frame 위치
+        """
+        pending: List[Tuple[float, SourceImage]] = []
+        for timestamp, frame in frames:
+            self.frames += 1
+            self.last_timestamp = timestamp
+            pending.append((timestamp, SourceImage(frame, self.decode_size)))
+            if len(pending) >= self.batch:
+                yield self._select(pending)
+                pending = []
+        if pending:
+            yield self._select(pending)
+
+    def _select(self, pending: List[Tuple[float, SourceImage]]) -> FrameBatch:
+        # 직전 감지 frame과 다른 화면만 감지 (이전 묶음의 마지막 감지 frame과 비교)
+        fingerprints = [fingerprint(img.detect_img) for _, img in pending]
+        targets: List[int] = []
+        reference = self._last_fingerprint
+        for idx, value in enumerate(fingerprints):
+            if reference is None or np.count_nonzero(reference != value) > self.same_distance:
+                targets.append(idx)
+                reference = value
+        self._last_fingerprint = reference
+        return FrameBatch(pending, fingerprints, targets)
+
+    def apply(self, batch: FrameBatch, results: List[Predict]) -> List[VideoResult]:
+        """감지 결과를 반영하여 끝난 결과 화면을 반환하는 함수
+
+        Args:
+            batch (FrameBatch): batches에서 받은 frame 묶음
+            results (List[Predict]): batch.targets 순서대로 감지된 객체 List
+
+        Returns:
+            List[VideoResult]: 이 묶음에서 끝난 결과 화면
+        """
+        return list(self._process(batch, results))
+
+    def _process(self, batch: FrameBatch, results: List[Predict]) -> Iterator[VideoResult]:
+        pending, fingerprints, targets = batch.pending, batch.fingerprints, batch.targets
+        detected = dict(zip(targets, results))
+        metrics.VIDEO_FRAMES.inc("detected", amount=len(targets))
+        metrics.VIDEO_FRAMES.inc("reused", amount=len(pending) - len(targets))
+        self.detected += len(targets)
+        self.reused += len(pending) - len(targets)
+        for idx, (timestamp, img) in enumerate(pending):
+            if idx in detected:
+                self._reference = (fingerprints[idx], img.to_full(detected[idx]))
+            result = self._reference[1]
+            # 원본 해상도는 결과 화면으로 고른 frame만 다시 만듦
+            img.release()
+            if result.scoreboard is None and len(result) < self.min_count:
+                if self._current is not None and timestamp - self._current.end > self.result_gap:
+                    yield self._finish()
+                continue
+            if self._current is not None and timestamp - self._current.end > self.result_gap:
+                yield self._finish()
+            if self._current is None:
+                self._current = VideoResult(timestamp, img, result)
+            else:
+                self._current.update(timestamp, img, result)
+
+    def _finish(self) -> VideoResult:
+        found = self._current
+        self._current = None
+        self.results += 1
+        metrics.VIDEO_RESULTS.inc()
+        return found
+
+    def finish(self) -> Optional[VideoResult]:
+        """마지막 frame까지 반영한 뒤 진행 중인 결과 화면을 반환하는 함수
+
+        Returns:
+            Optional[VideoResult]: 마지막 결과 화면, 없으면 None
+        """
+        return self._finish() if self._current is not None else None
+
+    def stats(self) -> dict:
+        """동영상 처리 통계 반환 함수
+
+        Returns:
+            dict: 읽은 frame 수, 감지한 frame 수, 감지를 건너뛴 frame 수, 찾은 결과 수
+        """
+        return {
+            "frames": self.frames,
+            "detected": self.detected,
+            "reused": self.reused,
+            "results": self.results,
+            "video_sec": self.last_timestamp,
+        }
+
+
+if __name__ == "__main__":
+    # 동영상에서 찾은 결과 화면 시간과 처리 속도 확인
+    #   python -m yolov8.video recording.mp4 --sample-fps 2
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--model", default=os.environ.get("YOLO_MODEL_PATH"))
+    parser.add_argument("--sample-fps", type=float, default=VIDEO_SAMPLE_FPS)
+    parser.add_argument("--min-count", type=int, default=5)
+    args = parser.parse_args()
+    scanner = VideoScanner(lambda images: predict_batch(args.model, images), args.min_count)
+    start = time.perf_counter()
+    for found in scanner.scan(read_video(args.video, args.sample_fps)):
+        print(f"{found.start:.1f}s ~ {found.end:.1f}s best={found.timestamp:.1f}s objects={len(found.predict)} frames={found.frames}")
+    elapsed = time.perf_counter() - start
+    stats = scanner.stats()
+    print(stats, f"elapsed={elapsed:.1f}s speed={stats['video_sec'] / elapsed if elapsed > 0 else 0:.1f}x")
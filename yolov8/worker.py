@@ -0,0 +1,237 @@
+import asyncio
+import metrics
+import multiprocessing
+import numpy as np
+import os
+import threading
+import time
+import yolov8.image as image
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+from multiprocessing.shared_memory import SharedMemory
+from PIL import Image
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from yolov8.predict import MODEL_REGISTRY, Predict, predict, predict_batch
+load_dotenv()
+DETECT_WORKERS = int(os.environ.get("DETECT_WORKERS", 0))
+_MODEL_PATH: Optional[str] = None
+
+class DetectPoolError(Exception):
+    """worker 프로세스가 계속 비정상 종료되어 감지할 수 없을 때 발생하는 예외"""
+
+
+def _init_worker(model_path: str) -> None:
+    # worker 프로세스마다 model을 한 번 불러와 warmup
+    global _MODEL_PATH
+    _MODEL_PATH = model_path
+    MODEL_REGISTRY.load(model_path)
+
+def _ping() -> int:
+    return os.getpid()
+
+def _detect(shm_name: str, length: int, min_count: int) -> Tuple[Predict, Optional[bytes], Dict[str, Any], float, Dict[str, float], Dict[str, str]]:
+    """worker 프로세스에서 이미지 decode, 감지, OCR 이미지 생성을 수행하는 함수
+
+    Args:
+        shm_name (str): 업로드 이미지가 담긴 shared memory 이름
+        length (int): 업로드 이미지 크기
+        min_count (int): OCR 이미지를 만들기 위한 최소 감지 객체 수
+
+    Returns:
+        Tuple[Predict, Optional[bytes], Dict[str, Any], float, Dict[str, float], Dict[str, str]]: 감지한 결과, OCR 이미지 jpeg, 로컬 OCR 결과, 처리 시간, 단계별 처리 시간, 항목별 로컬 OCR 결과
+    """
+    start = time.perf_counter()
+    shm = SharedMemory(name=shm_name)
+    try:
+        image_bytes = bytes(shm.buf[:length])
+    finally:
+        shm.close()
+    # 단계별 처리 시간과 로컬 OCR 결과 수는 부모 프로세스에서 기록
+    with metrics.trace() as timings:
+        img = image.SourceImage(image_bytes)
+        with metrics.stage("predict"):
+            result = img.to_full(predict(_MODEL_PATH, img.detect_img))
+        ocr_ready, local, outcomes = image.compose_local(img, result) if len(result) >= min_count else (None, {}, {})
+    return result, ocr_ready, local, time.perf_counter() - start, timings, outcomes
+
+
+def _release(shm: SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+
+def _predict(shm_name: str, shapes: List[Tuple[int, ...]], dtype: str) -> List[Predict]:
+    """worker 프로세스에서 이미 decode된 이미지(동영상 frame)를 감지하는 함수
+
+    Args:
+        shm_name (str): 이미지 배열을 이어서 담은 shared memory 이름
+        shapes (List[Tuple[int, ...]]): 이미지별 배열 모양 (높이, 너비, 채널)
+        dtype (str): 배열 dtype
+
+    Returns:
+        List[Predict]: 이미지 순서대로 감지된 객체 List
+    """
+    shm = SharedMemory(name=shm_name)
+    try:
+        images = []
+        offset = 0
+        for shape in shapes:
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            # shared memory를 닫기 전에 복사
+            images.append(Image.fromarray(array.copy()))
+            offset += array.nbytes
+            del array
+    finally:
+        shm.close()
+    return predict_batch(_MODEL_PATH, images)
+
+
+class DetectPool:
+    """
+    감지 및 OCR 이미지 생성을 worker 프로세스에서 수행하는 Class
+    worker마다 model을 하나씩 불러오고, 업로드 이미지는 shared memory로 전달
+    event loop는 결과만 기다림
+    worker가 비정상 종료(OOM 등)되어 pool이 망가지면 pool을 다시 만들고 한 번 더 시도
+    """
+    def __init__(self, model_path: str, workers: int = DETECT_WORKERS) -> None:
+        self.model_path = model_path
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.pending: int = 0
+        self.completed: int = 0
+        self.restarts: int = 0
+        self.busy: float = 0.0
+
+    def start(self) -> None:
+        """worker 프로세스 시작 함수 (서버 시작시 호출)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_path,),
+                )
+                # worker 프로세스를 미리 띄워 model warmup까지 마침
+                for _ in range(self.workers):
+                    self._executor.submit(_ping)
+                self._started = time.monotonic()
+
+    async def run(self, image_bytes: bytes, min_count: int) -> Tuple[Predict, Optional[bytes], Dict[str, Any]]:
+        """업로드 이미지를 worker에서 처리하는 함수
+
+        Args:
+            image_bytes (bytes): 업로드된 이미지
+            min_count (int): OCR 이미지를 만들기 위한 최소 감지 객체 수
+
+        Returns:
+            Tuple[Predict, Optional[bytes], Dict[str, Any]]: 감지한 결과, OCR 이미지 jpeg (감지 객체가 부족하면 None), 로컬 OCR 결과
+        """
+        shm = SharedMemory(create=True, size=max(1, len(image_bytes)))
+        try:
+            shm.buf[:len(image_bytes)] = image_bytes
+        except BaseException:
+            _release(shm)
+            raise
+        result, ocr_ready, local, busy, timings, outcomes = await self._submit(shm, _detect, len(image_bytes), min_count)
+        self.completed += 1
+        self.busy += busy
+        metrics.observe_stages(timings)
+        metrics.observe_local_ocr(outcomes)
+        return result, ocr_ready, local
+
+    async def predict(self, images: List[Image.Image]) -> List[Predict]:
+        """decode된 이미지 여러 장을 worker에서 한 번에 감지하는 함수 (동영상 frame)
+
+        Args:
+            images (List[Image.Image]): 감지용 이미지 List
+
+        Returns:
+            List[Predict]: 이미지 순서대로 감지된 객체 List
+        """
+        # pickle로 pipe를 거쳐 복사하지 않도록 RGB 배열을 shared memory에 이어서 씀
+        arrays = [np.asarray(img.convert("RGB"), dtype=np.uint8) for img in images]
+        shm = SharedMemory(create=True, size=max(1, sum(array.nbytes for array in arrays)))
+        try:
+            offset = 0
+            for array in arrays:
+                shm.buf[offset:offset + array.nbytes] = np.ascontiguousarray(array).reshape(-1)
+                offset += array.nbytes
+        except BaseException:
+            _release(shm)
+            raise
+        return await self._submit(shm, _predict, [array.shape for array in arrays], "uint8")
+
+    async def _submit(self, shm: SharedMemory, fn: Callable[..., Any], *args: Any) -> Any:
+        """shared memory에 담은 작업을 worker에 보내고 결과를 기다리는 함수
+        worker가 비정상 종료되면 pool을 다시 만들어 한 번 더 보내고, shared memory는 마지막 작업이 끝난 뒤 정리
+
+        Args:
+            shm (SharedMemory): 작업 데이터가 담긴 shared memory
+            fn (Callable[..., Any]): worker에서 실행할 함수 (첫 인자로 shared memory 이름을 받음)
+
+        Raises:
+            DetectPoolError: 다시 만든 pool에서도 worker가 비정상 종료된 경우
+
+        Returns:
+            Any: fn 결과
+        """
+        def done(future: Future) -> None:
+            # 요청이 취소되어도 worker가 읽는 중일 수 있으므로 worker 작업이 끝난 뒤 정리 (다시 보낼 작업은 유지)
+            if future.cancelled() or not isinstance(future.exception(), BrokenProcessPool):
+                _release(shm)
+
+        for _ in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                future = executor.submit(fn, shm.name, *args)
+            except BrokenProcessPool:
+                self._reset(executor)
+                continue
+            except BaseException:
+                _release(shm)
+                raise
+            future.add_done_callback(done)
+            self.pending += 1
+            try:
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                self._reset(executor)
+            finally:
+                self.pending -= 1
+        _release(shm)
+        raise DetectPoolError("Detect worker terminated abruptly")
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        # 망가진 pool을 버리고 다음 start에서 새로 만듦 (동시에 실패한 요청이 여러 번 버리지 않도록 확인)
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.restarts += 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        """worker 통계 반환 함수
+
+        Returns:
+            dict: worker 수, 대기 중인 작업 수, 처리 완료 수, pool 재시작 수, worker 사용률
+        """
+        elapsed = time.monotonic() - self._started
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "queue_depth": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "restarts": self.restarts,
+            "utilisation": self.busy / (elapsed * self.workers) if elapsed > 0 else 0.0,
+        }